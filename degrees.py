@@ -1,66 +1,546 @@
+import argparse
+import bisect
 import csv
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import random
+import struct
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from array import array
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
-from util import Node, StackFrontier, QueueFrontier
+from util import Node, StackFrontier, QueueFrontier, best_first_search
 
-# Maps names to a set of corresponding person_ids (key是名字，value是id)
+# Maps names to a tuple of corresponding person_ids (key是名字，value是id)
 names = {}
 
-# Maps person_ids to a dictionary of: name, birth, movies (a set of movie_ids)
-people = {}
+# `people` and `movies` are Table views, created empty below the Table
+# class and refilled in place by load_data
 
-# Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
-movies = {}
+# CSR co-star index over integer ids, built by load_data
+index = None
 
+# BFS distance arrays from a few landmark people, built by build_landmarks()
+landmarks = None
 
-def load_data(directory):
+# Prefix/trigram index over `names`, built by build_name_index()
+name_index = None
+
+# Binary snapshot written next to the CSV files by load_data
+SNAPSHOT = "degrees.snapshot"
+SNAPSHOT_MAGIC = b"DEGSNAP2"
+CSV_FILES = ("people.csv", "movies.csv", "stars.csv")
+
+
+def load_data(directory, use_snapshot=True):
     """
     Load data from CSV files into memory.
+
+    The files are streamed row by row into column lists and the CSR
+    co-star index; `people` and `movies` are views over those columns.
+
+    If `use_snapshot` is true, load from the binary snapshot in
+    `directory` when it is still current, and write a fresh one after
+    parsing the CSV files otherwise.
     """
-    # Load people(主要整理people所有演過的電影)
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    if use_snapshot and load_snapshot(directory):
+        return
+
+    # Load people(只存欄位，演過的電影之後由 stars 建成 CSR)
+    person_ids, person_names, births = [], [], []
+    person_index = {}
+    with open(f"{directory}/people.csv", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        id_col, name_col, birth_col = (columns.index(c) for c in ("id", "name", "birth"))
         for row in reader:
-            people[row["id"]] = {   #用id作为key
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()  #set()是集合
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}  #如果這個名字不在names里，就加入；且names是以小寫名字為key, id為value
-            else:
-                names[row["name"].lower()].add(row["id"])
+            person_index[row[id_col]] = len(person_ids)
+            person_ids.append(row[id_col])
+            person_names.append(row[name_col])
+            births.append(sys.intern(row[birth_col]))  #年份重複很多，共用同一個字串
 
-    # Load movies(整理movies的所有演員)
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    # Load movies
+    movie_ids, titles, years = [], [], []
+    movie_index = {}
+    with open(f"{directory}/movies.csv", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        id_col, title_col, year_col = (columns.index(c) for c in ("id", "title", "year"))
         for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
-
-    # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+            movie_index[row[id_col]] = len(movie_ids)
+            movie_ids.append(row[id_col])
+            titles.append(row[title_col])
+            years.append(sys.intern(row[year_col]))
+
+    # Load stars as two parallel int arrays, dropping unknown ids and duplicates
+    star_people = array("i")
+    star_movies = array("i")
+    seen = set()
+    with open(f"{directory}/stars.csv", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        person_col, movie_col = columns.index("person_id"), columns.index("movie_id")
         for row in reader:
-            try:
-                people[row["person_id"]]["movies"].add(row["movie_id"]) #把演員演過的電影加入people
-                movies[row["movie_id"]]["stars"].add(row["person_id"])  #把電影的演員加入movies
-            except KeyError:
-                pass
+            p = person_index.get(row[person_col])
+            m = movie_index.get(row[movie_col])
+            if p is None or m is None:
+                continue
+            key = p * len(movie_ids) + m
+            if key in seen:
+                continue
+            seen.add(key)
+            star_people.append(p)
+            star_movies.append(m)
+    del seen
+
+    person_offsets, person_movies = _csr(star_people, star_movies, len(person_ids))
+    movie_offsets, movie_stars = _csr(star_movies, star_people, len(movie_ids))
+    idx = CoStarIndex(person_ids, movie_ids, person_offsets, person_movies,
+                      movie_offsets, movie_stars,
+                      person_index=person_index, movie_index=movie_index)
+    _set_data(idx, person_names, births, titles, years)
+
+    if use_snapshot:
+        try:
+            write_snapshot(directory)
+        except OSError:
+            pass  # 目錄不可寫時就不快取，下次照樣讀 CSV
+
+
+def _csr(sources, targets, n):
+    """
+    Groups the edges `sources[i] -> targets[i]` by source and returns
+    `(offsets, neighbors)` arrays for `n` sources (a counting sort).
+    """
+    offsets = array("i", [0]) * (n + 1)
+    for s in sources:
+        offsets[s + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    neighbors = array("i", [0]) * len(sources)
+    fill = offsets[:-1]
+    for s, t in zip(sources, targets):
+        neighbors[fill[s]] = t
+        fill[s] += 1
+    return offsets, neighbors
+
+
+def _set_data(idx, person_names, births, titles, years):
+    """
+    Install a freshly loaded graph as the module-level `index`,
+    `people`, `movies` and `names`.
+    """
+    global index, name_index, landmarks
+    index = idx
+    # 原地更新，讓 `from degrees import people, movies, names` 的呼叫端也看得到新資料
+    people._reset(idx.person_ids, idx.person_index,
+                  {"name": person_names, "birth": births},
+                  idx.person_offsets, idx.person_movies, idx.movie_ids)
+    movies._reset(idx.movie_ids, idx.movie_index,
+                  {"title": titles, "year": years},
+                  idx.movie_offsets, idx.movie_stars, idx.person_ids)
+    by_name = {}
+    for person_id, name in zip(idx.person_ids, person_names):
+        key = name.lower()
+        ids = by_name.get(key)
+        by_name[key] = (person_id,) if ids is None else ids + (person_id,)
+    names.clear()
+    names.update(by_name)
+    name_index = None
+    landmarks = None
+
+
+class Table(Mapping):
+    """
+    Read-only mapping from an IMDB id to a Record view of its row.
+
+    Scalar fields live in parallel column lists; the one set-valued
+    field (`link`) is read out of a CSR offsets/neighbors pair.
+    """
+
+    def __init__(self, fields, link):
+        self.link = link
+        self._reset((), {}, {field: [] for field in fields}, array("i", [0]), array("i"), ())
+
+    def _reset(self, ids, id_index, columns, offsets, neighbors, link_ids):
+        """
+        Point this table at newly loaded columns and CSR arrays.
+        """
+        self.ids = ids
+        self.id_index = id_index
+        self.columns = columns
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.link_ids = link_ids
+
+    def __getitem__(self, key):
+        return Record(self, self.id_index[key])
+
+    def __contains__(self, key):
+        return key in self.id_index
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Record(Mapping):
+    """
+    One row of a Table, indexable like the dictionaries it replaces,
+    e.g. `people[person_id]["name"]`.
+    """
+    __slots__ = ("table", "i")
+
+    def __init__(self, table, i):
+        self.table = table
+        self.i = i
+
+    def __getitem__(self, field):
+        table = self.table
+        if field == table.link:
+            linked = table.neighbors[table.offsets[self.i]:table.offsets[self.i + 1]]
+            return {table.link_ids[j] for j in linked}
+        return table.columns[field][self.i]
+
+    def __iter__(self):
+        return itertools.chain(self.table.columns, (self.table.link,))
+
+    def __len__(self):
+        return len(self.table.columns) + 1
+
+
+# Maps person_ids to a read-only record of: name, birth, movies (a set of movie_ids)
+people = Table(("name", "birth"), "movies")
+
+# Maps movie_ids to a read-only record of: title, year, stars (a set of person_ids)
+movies = Table(("title", "year"), "stars")
+
+
+class CoStarIndex():
+    """
+    Person <-> movie adjacency stored as two CSR arrays over integer ids.
+
+    The movies of person `p` are
+    `person_movies[person_offsets[p]:person_offsets[p + 1]]` and the
+    stars of movie `m` are `movie_stars[movie_offsets[m]:movie_offsets[m + 1]]`.
+    """
+
+    def __init__(self, person_ids, movie_ids, person_offsets, person_movies,
+                 movie_offsets, movie_stars, person_index=None, movie_index=None):
+        self.person_ids = person_ids
+        self.movie_ids = movie_ids
+        if person_index is None:
+            person_index = {pid: i for i, pid in enumerate(person_ids)}
+        if movie_index is None:
+            movie_index = {mid: i for i, mid in enumerate(movie_ids)}
+        self.person_index = person_index
+        self.movie_index = movie_index
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_stars = movie_stars
+
+    def movies_of(self, p):
+        return self.person_movies[self.person_offsets[p]:self.person_offsets[p + 1]]
+
+    def stars_of(self, m):
+        return self.movie_stars[self.movie_offsets[m]:self.movie_offsets[m + 1]]
+
+    def neighbors(self, p):
+        """
+        Yields (movie, person) integer pairs for people who starred with `p`.
+        """
+        for m in self.movies_of(p):
+            for q in self.stars_of(m):
+                yield m, q
+
+
+def build_index():
+    """
+    Returns the CSR co-star index of the loaded data.
+
+    load_data builds the index while streaming stars.csv, so this only
+    fails if nothing has been loaded yet.
+    """
+    if index is None:
+        raise Exception("no data loaded")
+    return index
+
+
+def _source_stats(directory):
+    """
+    Returns [mtime_ns, size] for each CSV file, used to tell whether a
+    snapshot is still current.
+    """
+    stats = {}
+    for filename in CSV_FILES:
+        st = os.stat(os.path.join(directory, filename))
+        stats[filename] = [st.st_mtime_ns, st.st_size]
+    return stats
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def write_snapshot(directory):
+    """
+    Write the loaded `people` and `movies`, along with the CSR index,
+    to a binary snapshot in `directory`.
+
+    The file is a magic string, a length-prefixed JSON header and a
+    series of sections: NUL-separated UTF-8 string columns and native
+    int arrays from the index.
+    """
+    idx = build_index()
+    sections = {
+        "person_ids": idx.person_ids,
+        "names": people.columns["name"],
+        "births": people.columns["birth"],
+        "movie_ids": idx.movie_ids,
+        "titles": movies.columns["title"],
+        "years": movies.columns["year"],
+        "person_offsets": idx.person_offsets,
+        "person_movies": idx.person_movies,
+        "movie_offsets": idx.movie_offsets,
+        "movie_stars": idx.movie_stars,
+    }
+
+    blobs = []
+    layout = {}
+    offset = 0
+    for name, values in sections.items():
+        if isinstance(values, array):
+            blob = values.tobytes()
+        else:
+            blob = "\0".join(values).encode("utf-8")
+        layout[name] = [offset, len(blob)]
+        blobs.append((offset, blob))
+        offset = _align(offset + len(blob))
+
+    header = json.dumps({
+        "sources": _source_stats(directory),
+        "byteorder": sys.byteorder,
+        "itemsize": array("i").itemsize,
+        "people": len(idx.person_ids),
+        "movies": len(idx.movie_ids),
+        "sections": layout,
+    }).encode("utf-8")
+    base = _align(len(SNAPSHOT_MAGIC) + 4 + len(header))
+
+    # 先寫到唯一的暫存檔再換名，避免中斷時留下壞掉的快取，多個行程同時寫也不會互相覆蓋
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=SNAPSHOT + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for start, blob in blobs:
+                f.seek(base + start)
+                f.write(blob)
+        os.replace(temp, os.path.join(directory, SNAPSHOT))
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def load_snapshot(directory):
+    """
+    Load `people`, `movies`, `names` and the CSR index from the
+    snapshot in `directory` through mmap.
+
+    Returns False (loading nothing) if there is no snapshot, the CSV
+    files have changed since it was written, or the file is truncated
+    or otherwise malformed.
+    """
+    try:
+        f = open(os.path.join(directory, SNAPSHOT), "rb")
+    except OSError:
+        return False
+    with f:
+        try:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return False
+            (size,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(size))
+            if (header["sources"] != _source_stats(directory)
+                    or header["byteorder"] != sys.byteorder
+                    or header["itemsize"] != array("i").itemsize):
+                return False
+            base = _align(len(SNAPSHOT_MAGIC) + 4 + size)
+            length = os.fstat(f.fileno()).st_size
+            # 每個 section 都要完整落在檔案內，寫到一半的檔案就改讀 CSV
+            for name in ("person_ids", "names", "births", "movie_ids", "titles", "years",
+                         "person_offsets", "person_movies", "movie_offsets", "movie_stars"):
+                start, extent = header["sections"][name]
+                if start < 0 or extent < 0 or base + start + extent > length:
+                    return False
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (struct.error, ValueError, KeyError, TypeError, OSError):
+            return False
+
+    def section(name):
+        start, length = header["sections"][name]
+        return view[base + start:base + start + length]
+
+    def strings(name, count):
+        return bytes(section(name)).decode("utf-8").split("\0") if count else []
+
+    try:
+        idx = CoStarIndex(
+            strings("person_ids", header["people"]), strings("movie_ids", header["movies"]),
+            section("person_offsets").cast("i"), section("person_movies").cast("i"),
+            section("movie_offsets").cast("i"), section("movie_stars").cast("i")
+        )
+        births = [sys.intern(birth) for birth in strings("births", header["people"])]
+        years = [sys.intern(year) for year in strings("years", header["movies"])]
+        person_names = strings("names", header["people"])
+        titles = strings("titles", header["movies"])
+    except (TypeError, ValueError):
+        return False
+    # 欄位長度和 CSR 陣列要彼此一致，否則之後查鄰居才會 IndexError
+    if not (len(idx.person_ids) == len(person_names) == len(births) == header["people"]
+            and len(idx.movie_ids) == len(titles) == len(years) == header["movies"]
+            and len(idx.person_offsets) == header["people"] + 1
+            and len(idx.movie_offsets) == header["movies"] + 1
+            and idx.person_offsets[-1] == len(idx.person_movies)
+            and idx.movie_offsets[-1] == len(idx.movie_stars)):
+        return False
+    _set_data(idx, person_names, births, titles, years)
+    return True
+
+
+def parse_args(argv=None):
+    """
+    Parse command-line arguments for degrees.py.
+    """
+    parser = argparse.ArgumentParser(
+        prog="degrees.py",
+        usage="python degrees.py [directory] [options]"
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--bidirectional", action="store_true",
+                        help="search from both ends and meet in the middle")
+    parser.add_argument("--indexed", action="store_true",
+                        help="search over the precomputed CSR co-star index")
+    parser.add_argument("--astar", action="store_true",
+                        help="A* search with a landmark lower bound")
+    parser.add_argument("--landmarks", type=int, default=8, metavar="K",
+                        help="number of landmarks for --astar (default: 8)")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="always parse the CSV files, ignoring the snapshot")
+    parser.add_argument("--benchmark", type=int, metavar="PAIRS",
+                        help="compare search modes on PAIRS random pairs")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random seed for --benchmark")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer tab-separated name pairs from FILE "
+                             "('-' for stdin) as JSON lines")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="keep the graph loaded and answer HTTP queries")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address for --serve")
+    parser.add_argument("--cache-size", type=int, default=0, metavar="N",
+                        help="keep up to N shortest-path results in an LRU cache")
+    parser.add_argument("--cache-file", metavar="FILE",
+                        help="warm-start the cache from FILE and save it on exit")
+    parser.add_argument("--bacon", nargs="+", metavar="NAME",
+                        help="print the degree histogram relative to each hub")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes for --bacon (default: all cores)")
+    return parser.parse_args(argv)
+
+
+def select_search(args):
+    """
+    Returns the shortest-path function chosen on the command line.
+    """
+    if args.bidirectional:
+        return shortest_path_bidirectional
+    if args.indexed:
+        return shortest_path_indexed
+    if args.astar:
+        return shortest_path_astar
+    return shortest_path
 
 
 def main():
-    if len(sys.argv) > 2: 
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"  #如果有輸入directory就用輸入的，沒有就用large?
+    args = parse_args()
+    directory = args.directory  #如果有輸入directory就用輸入的，沒有就用large
+
+    # batch 模式的 stdout 只放 JSON lines，狀態訊息改印到 stderr
+    log = sys.stderr if args.batch else sys.stdout
 
     # Load data from files into memory
-    print("Loading data...")
-    load_data(directory)
-    print("Data loaded.")
+    print("Loading data...", file=log)
+    if args.benchmark:
+        tracemalloc.start()
+    # 量測記憶體時要讀 CSV，快取的 mmap 不會算進 tracemalloc
+    load_data(directory, use_snapshot=not (args.no_snapshot or args.benchmark))
+    print("Data loaded.", file=log)
+
+    if args.benchmark:
+        loaded, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Memory: loaded graph {loaded / 2**20:.1f}MiB, "
+              f"peak while loading {peak / 2**20:.1f}MiB")
+        start = time.perf_counter()
+        build_landmarks(args.landmarks)
+        print(f"Landmarks: {args.landmarks} in {time.perf_counter() - start:.2f}s")
+        benchmark(args.benchmark, seed=args.seed)
+        return
+    if args.batch or args.serve is not None:
+        build_name_index()
+    if args.astar:
+        build_landmarks(args.landmarks)
+    search = select_search(args)
+    cache = None
+    if args.cache_size:
+        cache = PathCache(args.cache_size)
+        if args.cache_file and os.path.exists(args.cache_file):
+            cache.load(args.cache_file)
+        search = cache.wrap(search)
+
+    if args.batch:
+        if args.batch == "-":
+            run_batch(sys.stdin, sys.stdout, search)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                run_batch(f, sys.stdout, search)
+        close_cache(cache, args.cache_file, log)
+        return
+    if args.serve is not None:
+        serve(args.host, args.serve, search)
+        close_cache(cache, args.cache_file, log)
+        return
+    if args.bacon:
+        hubs = [person_id_for_name(name) for name in args.bacon]
+        if None in hubs:
+            sys.exit("Person not found.")
+        if len(hubs) == 1:
+            histograms = {hubs[0]: degree_histogram(single_source_bfs(hubs[0])[0])}
+        else:
+            histograms = multi_source_histograms(hubs, directory, args.processes,
+                                                 not args.no_snapshot)
+        for hub in hubs:
+            print(f"Degrees of separation from {people[hub]['name']}:")
+            histogram = histograms[hub]
+            for degree in sorted(d for d in histogram if d is not None):
+                print(f"  {degree}: {histogram[degree]}")
+            print(f"  not connected: {histogram.get(None, 0)}")
+        return
 
     source = person_id_for_name(input("Name: "))  #讓使用者輸入名字
     if source is None:
@@ -69,7 +549,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)  #找出最短路徑(需自行實作的function!)
+    path = search(source, target)  #找出最短路徑(需自行實作的function!)
 
     if path is None:
         print("Not connected.")
@@ -82,6 +562,20 @@ def main():
             person2 = people[path[i + 1][1]]["name"]
             movie = movies[path[i + 1][0]]["title"]
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
+    close_cache(cache, args.cache_file, log)
+
+
+def close_cache(cache, filename, log):
+    """
+    Report the cache counters and save it to `filename`, if any.
+    """
+    if cache is None:
+        return
+    print(f"Cache: {cache.hits} hits, {cache.misses} misses, "
+          f"{cache.evictions} evictions, {len(cache)}/{cache.max_size} entries",
+          file=log)
+    if filename:
+        cache.save(filename)
 
 
 def shortest_path(source, target):
@@ -118,14 +612,609 @@ def shortest_path(source, target):
                 frontier.add(child)
     return None
 
-def person_id_for_name(name):
+
+def shortest_path_bidirectional(source, target):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, growing one BFS frontier
+    from each end and stopping when they meet.
+
+    If no possible path, returns None.
+    """
+    if source == target:
+        return []
+
+    # 兩邊各自記錄已到達的 state -> Node，Node.parent 指回各自的起點
+    forward = {source: Node(state=source, parent=None, action=None)}
+    backward = {target: Node(state=target, parent=None, action=None)}
+    forward_level = [source]
+    backward_level = [target]
+
+    while forward_level and backward_level:
+        # 每次展開較小的那一層，避免熱門演員讓 frontier 爆炸
+        if len(forward_level) <= len(backward_level):
+            forward_level, meeting = _expand_level(forward_level, forward, backward)
+        else:
+            backward_level, meeting = _expand_level(backward_level, backward, forward)
+        if meeting is not None:
+            return _join_paths(forward[meeting], backward[meeting])
+    return None
+
+
+def _expand_level(level, seen, other):
+    """
+    Expand every state in `level` by one hop, recording new states in
+    `seen`. Returns the next level and the best state already reached
+    by the `other` search (or None if the searches have not met).
+    """
+    next_level = []
+    meeting = None
+    best = None
+    for state in level:
+        node = seen[state]
+        for action, neighbor in neighbors_for_person(state):
+            if neighbor in seen:
+                continue
+            child = Node(state=neighbor, parent=node, action=action)
+            seen[neighbor] = child
+            next_level.append(neighbor)
+            if neighbor in other:
+                # 同一層可能有多個交會點，要取總長最短的那個
+                length = _depth(child) + _depth(other[neighbor])
+                if best is None or length < best:
+                    best = length
+                    meeting = neighbor
+    return next_level, meeting
+
+
+def _depth(node):
+    """
+    Returns the number of edges between `node` and the root of its search.
+    """
+    depth = 0
+    while node.parent is not None:
+        depth += 1
+        node = node.parent
+    return depth
+
+
+def _join_paths(forward_node, backward_node):
+    """
+    Joins the source-side chain ending at `forward_node` and the
+    target-side chain starting at `backward_node` (same state) into a
+    list of (movie_id, person_id) pairs from source to target.
+    """
+    path = []
+    node = forward_node
+    while node.parent is not None:
+        path.append((node.action, node.state))
+        node = node.parent
+    path.reverse()
+
+    # 從交會點往 target 走：backward 的 Node.action 是連到 parent 的電影
+    node = backward_node
+    while node.parent is not None:
+        path.append((node.action, node.parent.state))
+        node = node.parent
+    return path
+
+
+def shortest_path_indexed(source, target):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, using BFS over the CSR
+    co-star index built by load_data.
+
+    If no possible path, returns None.
+    """
+    idx = build_index()
+    src = idx.person_index[source]
+    dst = idx.person_index[target]
+    if src == dst:
+        return []
+
+    # parent[q] = 前一個人, via[q] = 連接兩人的電影；-1 代表還沒走到
+    parent = array("i", [-1]) * len(idx.person_ids)
+    via = array("i", [-1]) * len(idx.person_ids)
+    expanded = bytearray(len(idx.movie_ids))  # 每部電影只需展開一次
+    parent[src] = src
+    queue = deque([src])
+    while queue:
+        p = queue.popleft()
+        for m in idx.movies_of(p):
+            if expanded[m]:
+                continue
+            expanded[m] = 1
+            for q in idx.stars_of(m):
+                if parent[q] != -1:
+                    continue
+                parent[q] = p
+                via[q] = m
+                if q == dst:
+                    return _indexed_path(idx, parent, via, src, dst)
+                queue.append(q)
+    return None
+
+
+def _indexed_path(idx, parent, via, src, dst):
+    """
+    Follows `parent`/`via` back from `dst` to `src` and returns the
+    path as (movie_id, person_id) pairs.
+    """
+    path = []
+    q = dst
+    while q != src:
+        path.append((idx.movie_ids[via[q]], idx.person_ids[q]))
+        q = parent[q]
+    path.reverse()
+    return path
+
+
+def single_source_bfs(source):
+    """
+    Runs one BFS from `source` over the CSR index and returns
+    `(distance, parent, via)` arrays indexed by `index.person_index`.
+
+    distance[q] is the degrees of separation to person q (-1 if not
+    connected), parent[q] the previous person on a shortest path and
+    via[q] the movie linking them.
+    """
+    idx = build_index()
+    src = idx.person_index[source]
+    n = len(idx.person_ids)
+    distance = array("i", [-1]) * n
+    parent = array("i", [-1]) * n
+    via = array("i", [-1]) * n
+    expanded = bytearray(len(idx.movie_ids))
+    distance[src] = 0
+    parent[src] = src
+
+    level = [src]
+    depth = 0
+    while level:
+        depth += 1
+        next_level = []
+        for p in level:
+            for m in idx.movies_of(p):
+                if expanded[m]:
+                    continue
+                expanded[m] = 1
+                for q in idx.stars_of(m):
+                    if distance[q] == -1:
+                        distance[q] = depth
+                        parent[q] = p
+                        via[q] = m
+                        next_level.append(q)
+        level = next_level
+    return distance, parent, via
+
+
+def path_from_tree(source, target, parent, via):
+    """
+    Returns the (movie_id, person_id) path from `source` to `target`
+    recorded in the `parent`/`via` arrays of single_source_bfs(source),
+    or None if not connected.
+    """
+    idx = index
+    src = idx.person_index[source]
+    dst = idx.person_index[target]
+    if parent[dst] == -1:
+        return None
+    return _indexed_path(idx, parent, via, src, dst)
+
+
+def degree_histogram(distance):
+    """
+    Returns a dictionary mapping each degree of separation to the
+    number of people at that distance; None counts unconnected people.
+    """
+    histogram = {}
+    for d in distance:
+        key = None if d == -1 else d
+        histogram[key] = histogram.get(key, 0) + 1
+    return histogram
+
+
+def _init_worker(directory, use_snapshot):
+    # fork 出來的 worker 已共用父行程的索引；spawn 的 worker 才需要自己載入
+    if index is None:
+        load_data(directory, use_snapshot)
+
+
+def _histogram_for(source):
+    distance, _, _ = single_source_bfs(source)
+    return source, degree_histogram(distance)
+
+
+def multi_source_histograms(sources, directory, processes=None, use_snapshot=True):
+    """
+    Runs single_source_bfs from every person id in `sources` across a
+    process pool and returns a dictionary mapping each source to its
+    degree_histogram.
+
+    Workers are forked where the platform allows, so they share the
+    loaded graph read-only instead of copying it; otherwise each
+    worker loads `directory` itself, with the parent's `use_snapshot`.
+    """
+    build_index()
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with context.Pool(processes, initializer=_init_worker,
+                      initargs=(directory, use_snapshot)) as pool:
+        return dict(pool.imap_unordered(_histogram_for, sources))
+
+
+def reverse_path(source, path):
+    """
+    Returns the `path` from `source` to its last person as the
+    equivalent path walked the other way, back to `source`.
+    """
+    people_on_path = [source] + [person_id for _, person_id in path]
+    return [
+        (path[i][0], people_on_path[i])
+        for i in range(len(path) - 1, -1, -1)
+    ]
+
+
+class PathCache():
+    """
+    Bounded LRU cache of shortest-path results.
+
+    Each unordered pair of people is stored once; a lookup in the
+    opposite direction returns the cached path reversed.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # server 模式會多執行緒同時查詢
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, source, target, search):
+        """
+        Returns the cached path from `source` to `target`, computing
+        it with `search(source, target)` on a miss.
+        """
+        key = (source, target) if source <= target else (target, source)
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                path = self.entries[key]
+                if path is None or key[0] == source:
+                    return path
+                return reverse_path(target, path)
+            self.misses += 1
+
+        path = search(source, target)
+        self.put(source, target, path)
+        return path
+
+    def put(self, source, target, path):
+        if source > target:
+            source, target = target, source
+            if path is not None:
+                path = reverse_path(target, path)
+        with self.lock:
+            self.entries[(source, target)] = path
+            self.entries.move_to_end((source, target))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def wrap(self, search):
+        """
+        Returns a shortest-path function that goes through this cache.
+        """
+        def cached_search(source, target):
+            return self.get(source, target, search)
+        return cached_search
+
+    def save(self, filename):
+        """
+        Write the entries to `filename` as JSON, least recently used first.
+        """
+        with self.lock:
+            entries = [[source, target, path]
+                       for (source, target), path in self.entries.items()]
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+
+    def load(self, filename):
+        """
+        Warm-start from a file written by save(), keeping at most the
+        `max_size` most recently used entries.
+        """
+        with open(filename, encoding="utf-8") as f:
+            entries = json.load(f)
+        for source, target, path in entries[-self.max_size:]:
+            if path is not None:
+                path = [tuple(step) for step in path]
+            self.put(source, target, path)
+
+
+def build_landmarks(count=8):
+    """
+    Choose `count` landmark people and store their BFS distance arrays
+    in the module-level `landmarks`.
+
+    The first landmark is the person in the most movies; each next one
+    is the person farthest from all landmarks chosen so far.
+    """
+    global landmarks
+    idx = build_index()
+    offsets = idx.person_offsets
+    n = len(idx.person_ids)
+    if n == 0:
+        landmarks = []
+        return landmarks
+    landmark = max(range(n), key=lambda p: offsets[p + 1] - offsets[p])
+    nearest = array("i", [-1]) * n  # 到最近 landmark 的距離，-1 代表都到不了
+    tables = []
+    for _ in range(count):
+        distance = single_source_bfs(idx.person_ids[landmark])[0]
+        tables.append(distance)
+        farthest = 0
+        for p in range(n):
+            d = distance[p]
+            if d != -1 and (nearest[p] == -1 or d < nearest[p]):
+                nearest[p] = d
+            if nearest[p] > farthest:
+                farthest = nearest[p]
+                landmark = p
+        if farthest == 0:
+            break
+    landmarks = tables
+    return landmarks
+
+
+def landmark_bound(target):
+    """
+    Returns an admissible heuristic h(p) on the degrees of separation
+    between person index p and `target`, from the triangle inequality
+    |d(L, target) - d(L, p)| over every landmark L.
+    """
+    tables = landmarks if landmarks is not None else build_landmarks()
+    to_target = [(table, table[target]) for table in tables]
+
+    def heuristic(p):
+        best = 0
+        for table, d_target in to_target:
+            d = table[p]
+            if (d == -1) != (d_target == -1):
+                return float("inf")  # landmark 只到得了其中一個，表示不在同一個連通塊
+            if d != -1 and abs(d_target - d) > best:
+                best = abs(d_target - d)
+        return best
+    return heuristic
+
+
+def _astar(source, target, heuristic=None):
+    """
+    Runs best_first_search over the CSR index and returns
+    (path, expanded).
+    """
+    idx = build_index()
+    src = idx.person_index[source]
+    dst = idx.person_index[target]
+    if heuristic is None:
+        heuristic = landmark_bound(dst)
+
+    def expand(p):
+        for m, q in idx.neighbors(p):
+            yield m, q, 1
+
+    node, expanded = best_first_search(src, dst, expand, heuristic)
+    if node is None:
+        return None, expanded
+    path = []
+    while node.parent is not None:
+        path.append((idx.movie_ids[node.action], idx.person_ids[node.state]))
+        node = node.parent
+    path.reverse()
+    return path, expanded
+
+
+def shortest_path_astar(source, target):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, using A* with a landmark
+    lower bound.
+
+    If no possible path, returns None.
+    """
+    return _astar(source, target)[0]
+
+
+def benchmark(pairs, seed=None):
+    """
+    Time every available search mode on `pairs` random pairs of
+    people and check that each finds paths as short as plain BFS.
+    """
+    searches = {
+        "bfs": shortest_path,
+        "bidirectional": shortest_path_bidirectional,
+    }
+    if index is not None:
+        searches["indexed"] = shortest_path_indexed
+    if landmarks is not None:
+        searches["astar"] = shortest_path_astar
+
+    rng = random.Random(seed)
+    person_ids = list(people)
+    totals = {mode: 0.0 for mode in searches}
+    mismatches = 0
+    expanded = {"bfs": 0, "astar": 0}
+    for _ in range(pairs):
+        source = rng.choice(person_ids)
+        target = rng.choice(person_ids)
+
+        if landmarks is not None:
+            # 同一個 best-first driver，heuristic 為 0 時展開順序就跟 BFS 一樣
+            expanded["bfs"] += _astar(source, target, lambda p: 0)[1]
+            expanded["astar"] += _astar(source, target)[1]
+
+        lengths = set()
+        for mode, search in searches.items():
+            start = time.perf_counter()
+            path = search(source, target)
+            totals[mode] += time.perf_counter() - start
+            lengths.add(None if path is None else len(path))
+        if len(lengths) > 1:
+            mismatches += 1
+
+    print(f"Benchmark over {pairs} random pairs")
+    for mode, total in totals.items():
+        print(f"  {mode}: {total:.3f}s total, {1000 * total / pairs:.2f}ms per query")
+    print(f"  length mismatches: {mismatches}")
+    if landmarks is not None:
+        print(f"  nodes expanded: bfs {expanded['bfs']}, astar {expanded['astar']}")
+    benchmark_names(pairs, rng)
+    return totals
+
+
+def benchmark_names(queries, rng):
+    """
+    Time resolve_name on `queries` exact, prefix and misspelled names
+    each, taken from random people, and print the mean and worst
+    latency of each kind.
+    """
+    start = time.perf_counter()
+    build_name_index()
+    print(f"Name index: built in {time.perf_counter() - start:.2f}s")
+
+    person_ids = list(people)
+    kinds = {"exact": [], "prefix": [], "misspelled": []}
+    for _ in range(queries):
+        name = people[rng.choice(person_ids)]["name"]
+        i = rng.randrange(len(name))
+        kinds["exact"].append(name)
+        kinds["prefix"].append(name[:max(1, len(name) // 2)])
+        kinds["misspelled"].append(name[:i] + name[i + 1:])
+    for kind, texts in kinds.items():
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            resolve_name(text)
+            latencies.append(time.perf_counter() - start)
+        print(f"  resolve_name ({kind}): {1000 * sum(latencies) / len(latencies):.3f}ms mean, "
+              f"{1000 * max(latencies):.3f}ms worst")
+
+
+def query(source_name, target_name, search=shortest_path):
+    """
+    Answers one separation query without prompting.
+
+    Returns a JSON-serializable dictionary with the path between the
+    two named people, or an "error" entry if a name is unknown or
+    ambiguous.
+    """
+    result = {"source": source_name, "target": target_name}
+    ids = []
+    for name in (source_name, target_name):
+        person_id = person_id_for_name(name, interactive=False)
+        if person_id is None:
+            if name.lower() in names:
+                result["error"] = f"Ambiguous name: {name}"
+            else:
+                result["error"] = f"Person not found: {name}"
+            result["candidates"] = resolve_name(name)
+            return result
+        ids.append(person_id)
+
+    path = search(ids[0], ids[1])
+    if path is None:
+        result["degrees"] = None
+        result["path"] = None
+        return result
+    result["degrees"] = len(path)
+    result["path"] = [
+        {
+            "movie_id": movie_id,
+            "movie": movies[movie_id]["title"],
+            "person_id": person_id,
+            "person": people[person_id]["name"],
+        }
+        for movie_id, person_id in path
+    ]
+    return result
+
+
+def run_batch(lines, out, search=shortest_path):
+    """
+    Reads "name<TAB>name" pairs from `lines` and writes one JSON
+    result per pair to `out` as soon as it is answered.
+    """
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        fields = line.split("\t")
+        if len(fields) != 2:
+            result = {"input": line, "error": "Expected two tab-separated names"}
+        else:
+            result = query(fields[0].strip(), fields[1].strip(), search)
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET /?source=NAME&target=NAME with a JSON query result.
+    """
+    search = staticmethod(shortest_path)
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        if "source" not in params or "target" not in params:
+            self._send(400, {"error": "source and target are required"})
+            return
+        self._send(200, query(params["source"][0], params["target"][0], self.search))
+
+    def _send(self, status, result):
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host, port, search=shortest_path):
+    """
+    Serve queries over HTTP until interrupted, one thread per request,
+    all sharing the loaded graph.
+    """
+    handler = type("Handler", (QueryHandler,), {"search": staticmethod(search)})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving on http://{host}:{server.server_port}/?source=...&target=...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def person_id_for_name(name, interactive=True):
     """
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
+
+    If `interactive` is false, ambiguous names return None instead of
+    prompting.
     """
     person_ids = list(names.get(name.lower(), set()))
     if len(person_ids) == 0:
         return None
+    elif len(person_ids) > 1 and not interactive:
+        return None
     elif len(person_ids) > 1:   #如果有多個人有同樣的名字，就要讓使用者選擇
         print(f"Which '{name}'?")
         for person_id in person_ids:
@@ -145,16 +1234,139 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+class NameIndex():
+    """
+    Non-interactive name lookup over the keys of `names`.
+
+    Prefix matches come from a sorted key list searched with bisect;
+    fuzzy matches come from an inverted index of character trigrams.
+    """
+
+    # 每次查詢最多掃描這麼多 posting，讓很常見的 trigram 不會拖慢查詢
+    MAX_POSTINGS = 1024
+
+    def __init__(self, keys):
+        self.keys = sorted(keys)
+        self.trigrams = {}
+        self.sizes = array("h")
+        for i, key in enumerate(self.keys):
+            trigrams = _trigrams(key)
+            self.sizes.append(len(trigrams))
+            for trigram in trigrams:
+                postings = self.trigrams.get(trigram)
+                if postings is None:
+                    postings = self.trigrams[trigram] = array("i")
+                postings.append(i)
+
+    def prefix(self, text, limit):
+        """
+        Returns up to `limit` keys that start with `text`.
+        """
+        start = bisect.bisect_left(self.keys, text)
+        matches = []
+        for key in self.keys[start:start + limit]:
+            if not key.startswith(text):
+                break
+            matches.append(key)
+        return matches
+
+    def similar(self, text, limit):
+        """
+        Returns up to `limit` (score, key) pairs ranked by trigram
+        Jaccard similarity to `text`.
+
+        Candidates come from the posting lists of the rarest trigrams
+        of `text`, scanning at most MAX_POSTINGS entries in total, so a
+        query costs about the same however common its trigrams are.
+        For names whose rarest trigrams are all very common, some
+        lower-ranked matches may be missed.
+        """
+        wanted = _trigrams(text)
+        # 只用最稀有的 4 個 trigram 找候選：錯一個字最多影響 3 個 trigram，
+        # 所以至少會有一個 trigram 命中，又不必掃描很長的 posting list
+        rare = sorted((t for t in wanted if t in self.trigrams),
+                      key=lambda t: len(self.trigrams[t]))[:4]
+        counts = Counter()
+        budget = self.MAX_POSTINGS
+        for trigram in rare:
+            postings = self.trigrams[trigram]
+            counts.update(postings[:budget])  # Counter.update 的計數迴圈在 C 裡
+            budget -= len(postings)
+            if budget <= 0:
+                break
+
+        scored = []
+        for i, _ in counts.most_common(4 * limit):
+            key = self.keys[i]
+            # 交集大小直接在補過空白的字串裡找子字串，不必為每個候選建 trigram 集合
+            padded = f"  {key} "
+            shared = sum(1 for t in wanted if t in padded)
+            scored.append((shared / (len(wanted) + self.sizes[i] - shared), key))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return scored[:limit]
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_name_index():
+    """
+    Build the name index from the loaded `names` and store it in the
+    module-level `name_index`.
+    """
+    global name_index
+    name_index = NameIndex(names)
+    return name_index
+
+
+def resolve_name(name, limit=10):
+    """
+    Returns up to `limit` candidate people for a full, partial or
+    misspelled name, best first, without prompting.
+
+    Each candidate is a dictionary of person_id, name, birth and a
+    score between 0 and 1 (1 for an exact match).
+    """
+    idx = name_index if name_index is not None else build_name_index()
+    text = " ".join(name.lower().split())
+    scores = {}
+    if text in names:
+        scores[text] = 1.0
+    for key in idx.prefix(text, limit):
+        scores.setdefault(key, 0.5 + 0.5 * len(text) / len(key))
+    for score, key in idx.similar(text, limit):
+        scores[key] = max(score, scores.get(key, 0))
+
+    candidates = []
+    for key, score in scores.items():
+        for person_id in names[key]:
+            person = people[person_id]
+            candidates.append({
+                "person_id": person_id,
+                "name": person["name"],
+                "birth": person["birth"],
+                "score": round(score, 3),
+            })
+    candidates.sort(key=lambda c: (-c["score"], c["name"], c["person_id"]))
+    return candidates[:limit]
+
+
 def neighbors_for_person(person_id):  #找出與某人共同演過某部電影的人，並回傳(movie_id, person_id) pairs
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
-    movie_ids = people[person_id]["movies"]
+    # 直接走 CSR 陣列，不經過 people/movies 的 Record 每次重建集合
+    idx = build_index()
+    person_ids = idx.person_ids
+    movie_ids = idx.movie_ids
     neighbors = set()
-    for movie_id in movie_ids:
-        for person_id in movies[movie_id]["stars"]:
-            neighbors.add((movie_id, person_id))
+    for m in idx.movies_of(idx.person_index[person_id]):
+        movie_id = movie_ids[m]
+        for q in idx.stars_of(m):
+            neighbors.add((movie_id, person_ids[q]))
     return neighbors  #回傳候選的(movie_id, person_id) pairs，以集合的形式
 
 
@@ -1,6 +1,21 @@
+import argparse
+import contextlib
 import csv
+import heapq
+import io
 import itertools
+import json
+import multiprocessing
+import os
+import random
 import sys
+import time
+from collections import Counter, defaultdict
+
+try:
+    import numpy as np
+except ImportError:  # 只有批次向量化的版本需要 numpy
+    np = None
 
 PROBS = {
 
@@ -36,16 +51,103 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Number of people whose genes parallel_probabilities shards on by default
+SHARD_PEOPLE = 4
+
+
+def parse_args(argv=None):
+    """
+    Parse command-line arguments for heredity.py.
+    """
+    parser = argparse.ArgumentParser(
+        prog="heredity.py",
+        usage="python heredity.py data.csv [options]"
+    )
+    parser.add_argument("data", nargs="?")
+    parser.add_argument("--method", choices=["enumeration", "pruned", "parallel", "vectorized", "elimination"],
+                        default="enumeration",
+                        help="enumerate every assignment one at a time, lazily with "
+                             "pruning (optionally across processes), or in numpy "
+                             "batches, or run variable elimination")
+    parser.add_argument("--batch-size", type=int, default=1 << 16,
+                        help="assignments per batch for --method vectorized")
+    parser.add_argument("--processes", type=int, metavar="P",
+                        help="worker processes for --method parallel (default: all cores)")
+    parser.add_argument("--shard-people", type=int, metavar="K",
+                        help="shard --method parallel on the genes of the first K people")
+    parser.add_argument("--scaling", action="store_true",
+                        help="time --method parallel from 1 process up to one per core")
+    parser.add_argument("--benchmark", type=int, nargs="*", metavar="PEOPLE",
+                        help="compare both methods on synthetic families of each size")
+    parser.add_argument("--trace", action="store_true",
+                        help="print assignment counters and time per phase to stderr")
+    parser.add_argument("--trace-samples", metavar="FILE",
+                        help="also write a sample of evaluated assignments to FILE "
+                             "as JSON lines (implies --trace)")
+    parser.add_argument("--trace-rate", type=float, default=0.001,
+                        help="fraction of assignments to sample (default 0.001)")
+    args = parser.parse_args(argv)
+    if args.data is None and args.benchmark is None and not args.scaling:
+        parser.error("a data file is required")
+    return args
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    args = parse_args()
+    if args.benchmark is not None:
+        benchmark(args.benchmark or (3, 5, 7, 20, 100, 1000))
+        return
+    if args.scaling:
+        people = load_data(args.data) if args.data else synthetic_family(9)
+        scaling_benchmark(people, args.shard_people)
+        return
+    people = load_data(args.data)
+
+    tracer = None
+    if args.trace or args.trace_samples:
+        tracer = Tracer(args.trace_samples, args.trace_rate)
 
-    # Keep track of gene and trait probabilities for each person 
-    probabilities = {
+    if args.method == "elimination":
+        probabilities = eliminate_probabilities(people, tracer)
+    elif args.method == "vectorized":
+        probabilities = vectorized_probabilities(people, args.batch_size, tracer)
+    elif args.method == "pruned":
+        counts = Counter()
+        probabilities = pruned_probabilities(people, tracer, counts)
+        if tracer is None:
+            # 有 --trace 時這些數字已經在 tracer 的報告裡
+            print(f"{counts['assignments evaluated']} assignments, "
+                  f"{counts['partial assignments']} partial assignments, "
+                  f"{counts['branches pruned by evidence']} branches pruned by evidence, "
+                  f"{counts['branches pruned as impossible']} branches pruned as impossible",
+                  file=sys.stderr)
+    elif args.method == "parallel":
+        probabilities = parallel_probabilities(people, args.processes,
+                                               args.shard_people, tracer)
+    else:
+        probabilities = enumerate_probabilities(people, tracer)
+
+    if tracer is not None:
+        tracer.close()
+        tracer.report()
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def empty_probabilities(people):
+    """
+    Returns a probability table of zeros for every person in `people`.
+    """
+    return {
         person: {
             "gene": {
                 2: 0,
@@ -60,6 +162,111 @@ def main():
         for person in people
     }
 
+
+class Tracer():
+    """
+    Opt-in instrumentation for the inference methods.
+
+    Counts events, accumulates wall time per phase and, if
+    `sample_file` is given, writes roughly `rate` of the evaluated
+    assignments to it as JSON lines. Methods take `tracer=None` and
+    only test it once per assignment when tracing is off.
+    """
+
+    def __init__(self, sample_file=None, rate=0.001, seed=0, buffer=False):
+        self.counters = Counter()
+        self.timings = defaultdict(float)
+        self.rate = rate
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # buffer=True 時樣本先寫在記憶體，給 worker 行程回傳後由主行程寫檔
+        if buffer:
+            self.samples = io.StringIO()
+        else:
+            self.samples = open(sample_file, "w") if sample_file else None
+
+    def count(self, event, n=1):
+        self.counters[event] += n
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def wants_sample(self):
+        return self.samples is not None and self.rng.random() < self.rate
+
+    def sample(self, genes, have_trait, p):
+        """
+        Record one assignment: `genes` maps each person to a gene count
+        and `have_trait` is the set of people with the trait.
+        """
+        record = {"genes": genes, "have_trait": sorted(have_trait), "p": p}
+        self.samples.write(json.dumps(record) + "\n")
+        self.count("assignments sampled")
+
+    def sample_sets(self, people, one_gene, two_genes, have_trait, p):
+        """
+        Record one assignment given as the sets joint_probability takes.
+        """
+        genes = {
+            person: 1 if person in one_gene else 2 if person in two_genes else 0
+            for person in people
+        }
+        self.sample(genes, have_trait, p)
+
+    def shard(self, i):
+        """
+        Return picklable settings for the Tracer of shard `i` of a
+        parallel run, seeded per shard so samples do not depend on
+        scheduling.
+        """
+        return self.rate, f"{self.seed}:{i}", self.samples is not None
+
+    def summary(self):
+        """
+        Return this buffered Tracer's counters, timings and samples in
+        a form that can be sent back from a worker process.
+        """
+        samples = self.samples.getvalue() if self.samples is not None else ""
+        return dict(self.counters), dict(self.timings), samples
+
+    def merge(self, summary):
+        """
+        Add a worker's summary to this Tracer. Phase times are summed
+        over workers, so they measure CPU time, not wall time.
+        """
+        counters, timings, samples = summary
+        self.counters.update(counters)
+        for name, seconds in timings.items():
+            self.timings[name] += seconds
+        if samples and self.samples is not None:
+            self.samples.write(samples)
+
+    def close(self):
+        if self.samples is not None:
+            self.samples.close()
+            self.samples = None
+
+    def report(self, file=sys.stderr):
+        for event, n in self.counters.items():
+            print(f"{event}: {n}", file=file)
+        for name, seconds in self.timings.items():
+            print(f"time in {name}: {seconds:.4f}s", file=file)
+
+
+def enumerate_probabilities(people, tracer=None):
+    """
+    Compute each person's gene and trait distribution by summing
+    joint_probability over every assignment consistent with the
+    known traits.
+    """
+    # Keep track of gene and trait probabilities for each person
+    probabilities = empty_probabilities(people)
+
     # Loop over all sets of people who might have the trait
     names = set(people)
     for have_trait in powerset(names):
@@ -71,6 +278,9 @@ def main():
             for person in names
         )
         if fails_evidence:
+            if tracer is not None:
+                tracer.count("trait sets pruned by evidence")
+                tracer.count("assignments pruned by evidence", 3 ** len(names))
             continue
 
         # Loop over all sets of people who might have the gene
@@ -78,20 +288,261 @@ def main():
             for two_genes in powerset(names - one_gene):  #列出two_genes 所有可能的组合，但須排除已經在one_gene的人
 
                 # Update probabilities with new joint probability(依續計算出各種組合的機率，並更新至probabilities)
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+                if tracer is None:
+                    p = joint_probability(people, one_gene, two_genes, have_trait)
+                    update(probabilities, one_gene, two_genes, have_trait, p)
+                    continue
+
+                with tracer.phase("joint_probability"):
+                    p = joint_probability(people, one_gene, two_genes, have_trait)
+                with tracer.phase("update"):
+                    update(probabilities, one_gene, two_genes, have_trait, p)
+                tracer.count("assignments evaluated")
+                if tracer.wants_sample():
+                    tracer.sample_sets(people, one_gene, two_genes, have_trait, p)
 
     # Ensure probabilities sum to 1
-    normalize(probabilities)
+    if tracer is None:
+        normalize(probabilities)
+    else:
+        with tracer.phase("normalize"):
+            normalize(probabilities)
+    return probabilities
 
-    # Print results
+
+def topological_order(people):
+    """
+    Return the names in `people` ordered so that parents come before
+    their children.
+    """
+    order = []
+    placed = set()
     for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+        # 沿著父母往上找，先放還沒放的祖先
+        stack = [(person, False)]
+        while stack:
+            name, expanded = stack.pop()
+            if name in placed:
+                continue
+            if expanded:
+                placed.add(name)
+                order.append(name)
+                continue
+            stack.append((name, True))
+            for parent in (people[name]["mother"], people[name]["father"]):
+                if parent is not None and parent not in placed:
+                    stack.append((parent, False))
+    return order
+
+
+def pruned_assignments(people, counts=None, fixed=None):
+    """
+    Lazily yield (one_gene, two_genes, have_trait, p) for every
+    assignment with non-zero probability that agrees with the known
+    traits, where p is its joint probability.
+
+    People are assigned parents-first, so each person's factor in the
+    joint probability is known as soon as they are assigned and a
+    partial assignment is dropped as soon as its running probability
+    reaches zero or a trait contradicts the evidence. The yielded sets
+    are reused and only valid until the next assignment is requested.
+    If `counts` is a Counter, it is updated with the number of
+    complete and partial assignments and of branches pruned. `fixed`
+    optionally maps some people to the only gene count to try for them.
+    """
+    order = topological_order(people)
+    inheritance = inheritance_table()
+    if counts is None:
+        counts = Counter()
+    if fixed is None:
+        fixed = {}
+    genes = {}
+    one_gene, two_genes, have_trait = set(), set(), set()
+    by_count = {1: one_gene, 2: two_genes}
+
+    def extend(i, probability):
+        if i == len(order):
+            counts["assignments evaluated"] += 1
+            yield one_gene, two_genes, have_trait, probability
+            return
+
+        person = order[i]
+        data = people[person]
+        if data["mother"] is None and data["father"] is None:
+            distribution = PROBS["gene"]
+        else:
+            # 沒列出的父母當作 0 個基因，和 joint_probability 一樣
+            distribution = inheritance[
+                genes.get(data["mother"], 0), genes.get(data["father"], 0)
+            ]
+        evidence = data["trait"]
+
+        for num_genes in (fixed[person],) if person in fixed else (2, 1, 0):
+            gene_probability = probability * distribution[num_genes]
+            if gene_probability == 0:
+                counts["branches pruned as impossible"] += 1
+                continue
+            genes[person] = num_genes
+            if num_genes:
+                by_count[num_genes].add(person)
+            for has_trait in (True, False):
+                if evidence is not None and evidence != has_trait:
+                    counts["branches pruned by evidence"] += 1
+                    continue
+                p = gene_probability * PROBS["trait"][num_genes][has_trait]
+                if p == 0:
+                    counts["branches pruned as impossible"] += 1
+                    continue
+                counts["partial assignments"] += 1
+                if has_trait:
+                    have_trait.add(person)
+                yield from extend(i + 1, p)
+                have_trait.discard(person)
+            if num_genes:
+                by_count[num_genes].discard(person)
+        genes.pop(person, None)
+
+    return extend(0, 1)
+
+
+def pruned_probabilities(people, tracer=None, counts=None):
+    """
+    Compute the same distributions as enumerate_probabilities from
+    pruned_assignments, without building any powerset. The assignment
+    counts go to `tracer`'s counters if tracing, else to `counts`.
+    """
+    if tracer is not None:
+        counts = tracer.counters
+    probabilities = empty_probabilities(people)
+    accumulate_pruned(probabilities, people, pruned_assignments(people, counts), tracer)
+    if tracer is None:
+        normalize(probabilities)
+    else:
+        with tracer.phase("normalize"):
+            normalize(probabilities)
+    return probabilities
+
+
+def accumulate_pruned(probabilities, people, assignments, tracer=None):
+    """
+    update `probabilities` with every assignment from the
+    pruned_assignments generator `assignments`.
+    """
+    if tracer is None:
+        for one_gene, two_genes, have_trait, p in assignments:
+            update(probabilities, one_gene, two_genes, have_trait, p)
+        return
+
+    while True:
+        with tracer.phase("pruned_assignments"):
+            assignment = next(assignments, None)
+        if assignment is None:
+            return
+        one_gene, two_genes, have_trait, p = assignment
+        with tracer.phase("update"):
+            update(probabilities, one_gene, two_genes, have_trait, p)
+        if tracer.wants_sample():
+            tracer.sample_sets(people, one_gene, two_genes, have_trait, p)
+
+
+# 給 worker 行程用的家族資料；fork 時直接繼承，不必每個任務重新 pickle
+_shard_people = None
+
+
+def _init_shard(people):
+    global _shard_people
+    _shard_people = people
+
+
+def _shard_task(task):
+    fixed, trace = task
+    probabilities = empty_probabilities(_shard_people)
+    if trace is None:
+        accumulate_pruned(probabilities, _shard_people,
+                          pruned_assignments(_shard_people, fixed=fixed))
+        return probabilities, None
+    rate, seed, sampling = trace
+    tracer = Tracer(rate=rate, seed=seed, buffer=sampling)
+    assignments = pruned_assignments(_shard_people, tracer.counters, fixed)
+    accumulate_pruned(probabilities, _shard_people, assignments, tracer)
+    return probabilities, tracer.summary()
+
+
+def shards(people, k):
+    """
+    Split the assignments into 3^k shards, one per gene assignment of
+    the first `k` people in topological order, as a list of `fixed`
+    dicts for pruned_assignments.
+    """
+    first = topological_order(people)[:k]
+    return [dict(zip(first, genes)) for genes in itertools.product((2, 1, 0), repeat=len(first))]
+
+
+def default_shard_people(people):
+    """
+    Return how many people to shard on by default: SHARD_PEOPLE, or
+    everyone in a smaller family. The 3^4 = 81 shards keep pools of up
+    to about 20 processes busy, and the choice does not depend on the
+    number of processes, so neither does the summation order.
+    """
+    return min(SHARD_PEOPLE, len(people))
+
+
+def parallel_probabilities(people, processes=None, k=None, tracer=None):
+    """
+    Compute the same distributions as pruned_probabilities with the
+    assignments sharded across a process pool.
+
+    By default `k` comes from default_shard_people.
+    Each worker returns unnormalized partial tables; they are summed in
+    shard order, whatever order the workers finish in, so the result
+    is the same for any number of processes. With a `tracer`, each
+    shard traces into its own buffered Tracer and the summaries,
+    including sampled assignments, are merged in shard order too.
+    """
+    processes = processes or os.cpu_count() or 1
+    if k is None:
+        k = default_shard_people(people)
+    tasks = [
+        (fixed, tracer.shard(i) if tracer is not None else None)
+        for i, fixed in enumerate(shards(people, k))
+    ]
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with context.Pool(processes, initializer=_init_shard, initargs=(people,)) as pool:
+        results = pool.map(_shard_task, tasks)
+
+    probabilities = empty_probabilities(people)
+    for partial, summary in results:
+        if tracer is not None:
+            tracer.merge(summary)
+        for person in partial:
+            for field in partial[person]:
+                for value, p in partial[person][field].items():
+                    probabilities[person][field][value] += p
+    normalize(probabilities)
+    if tracer is not None:
+        tracer.count("shards", len(tasks))
+    return probabilities
+
+
+def scaling_benchmark(people, k=None):
+    """
+    Time parallel_probabilities with 1 process up to one per core and
+    print the speedup over a single process. Every run shards on the
+    same `k` people, so every run does the same work.
+    """
+    cores = os.cpu_count() or 1
+    if k is None:
+        k = default_shard_people(people)
+    baseline = None
+    for processes in range(1, cores + 1):
+        start = time.perf_counter()
+        parallel_probabilities(people, processes, k)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{processes} processes: {elapsed:.3f}s, speedup {baseline / elapsed:.2f}x")
 
 
 def load_data(filename):
@@ -170,8 +621,6 @@ def joint_probability(people, one_gene, two_genes, have_trait):
                 gene_prob = (1 - mother_prob) * father_prob * ((1 - PROBS["mutation"])**2 + PROBS["mutation"]**2) + mother_prob * (1 - father_prob) * ((1 - PROBS["mutation"])**2 + PROBS["mutation"]**2) + mother_prob * father_prob * (PROBS["mutation"] * (1 - PROBS["mutation"]) + (1 - PROBS["mutation"]) * PROBS["mutation"]) + (1 - mother_prob) * (1 - father_prob) * (PROBS["mutation"] * (1 - PROBS["mutation"]) + (1 - PROBS["mutation"]) * PROBS["mutation"])
             else:
                 gene_prob = mother_prob * father_prob * (1 - PROBS["mutation"]) * (1 - PROBS["mutation"]) + (1 - mother_prob) * father_prob * PROBS["mutation"] * (1 - PROBS["mutation"]) + mother_prob * (1 - father_prob) * (1 - PROBS["mutation"]) * PROBS["mutation"] + (1 - mother_prob) * (1 - father_prob) * PROBS["mutation"] * PROBS["mutation"]
-            print("Gene probability:", gene_prob)
-            print("Trait probability:", PROBS["trait"][num_genes][has_trait])
             probability *= gene_prob * PROBS["trait"][num_genes][has_trait]
     return probability
 
@@ -222,5 +671,495 @@ def normalize(probabilities):
             probabilities[person]["trait"][has_trait] /= trait_sum
 
 
+def inheritance_table():
+    """
+    Return {(mother_genes, father_genes): {child_genes: probability}}
+    derived from PROBS["mutation"].
+
+    A parent passes the gene with probability 1 - mutation if they
+    have two copies, 0.5 if they have one and mutation if they have
+    none; the child's count is the sum of the two independent draws.
+    """
+    mutation = PROBS["mutation"]
+    passes = {0: mutation, 1: 0.5, 2: 1 - mutation}
+    table = {}
+    for mother, father in itertools.product(passes, repeat=2):
+        m, f = passes[mother], passes[father]
+        table[mother, father] = {
+            0: (1 - m) * (1 - f),
+            1: m * (1 - f) + (1 - m) * f,
+            2: m * f
+        }
+    return table
+
+
+class Factor():
+    """
+    A non-negative function over the gene counts of `variables`, stored
+    as a dict from a tuple of gene counts (one per variable) to a value.
+    """
+
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = table
+
+    def multiply(self, other):
+        variables = self.variables + tuple(
+            v for v in other.variables if v not in self.variables
+        )
+        position = {v: i for i, v in enumerate(variables)}
+        mine = [position[v] for v in self.variables]
+        theirs = [position[v] for v in other.variables]
+        table = {}
+        for values in itertools.product((0, 1, 2), repeat=len(variables)):
+            a = self.table.get(tuple(values[i] for i in mine), 0)
+            if not a:
+                continue
+            b = other.table.get(tuple(values[i] for i in theirs), 0)
+            if b:
+                table[values] = a * b
+        return Factor(variables, table)
+
+    def project(self, variables):
+        """
+        Sum out every variable not in `variables`.
+        """
+        keep = [self.variables.index(v) for v in variables]
+        table = {}
+        for values, p in self.table.items():
+            key = tuple(values[i] for i in keep)
+            table[key] = table.get(key, 0) + p
+        return Factor(variables, table)
+
+    def normalized(self):
+        """
+        Return this factor scaled to sum to 1, so long chains of
+        messages do not underflow. Marginals are normalized at the end,
+        so the scale never matters.
+        """
+        total = sum(self.table.values())
+        return Factor(self.variables, {k: p / total for k, p in self.table.items()})
+
+
+def product(factors):
+    """
+    Return the product of `factors`, rescaled after each step so that
+    many messages multiplied together do not underflow.
+    """
+    result = Factor((), {(): 1})
+    for f in factors:
+        result = result.multiply(f).normalized()
+    return result
+
+
+def pedigree_factors(people):
+    """
+    Return one Factor per person: P(genes | parents' genes) times
+    P(known trait | genes). People with an unknown trait contribute no
+    evidence, so the trait variable sums out to 1 and is left out.
+    """
+    inheritance = inheritance_table()
+    factors = []
+    for person, data in people.items():
+        evidence = data["trait"]
+        if data["mother"] is None and data["father"] is None:
+            variables = (person,)
+            table = {(g,): PROBS["gene"][g] for g in (0, 1, 2)}
+        else:
+            # 只列出一位父母時，沒列出的那位和 joint_probability 一樣當作 0 個基因
+            parents = [p for p in (data["mother"], data["father"]) if p is not None]
+            variables = tuple(parents) + (person,)
+            table = {}
+            for values in itertools.product((0, 1, 2), repeat=len(variables)):
+                genes = dict(zip(variables, values))
+                mother = genes.get(data["mother"], 0)
+                father = genes.get(data["father"], 0)
+                table[values] = inheritance[mother, father][values[-1]]
+        if evidence is not None:
+            table = {
+                values: p * PROBS["trait"][values[-1]][evidence]
+                for values, p in table.items()
+            }
+        factors.append(Factor(variables, table))
+    return factors
+
+
+def elimination_order(factors):
+    """
+    Return an order in which to sum out every variable of `factors`.
+
+    Greedy min-size: repeatedly eliminate the variable with the fewest
+    neighbours in the interaction graph, connecting those neighbours to
+    each other. For a tree-like pedigree no step involves more than one
+    nuclear family.
+    """
+    neighbors = {}
+    for f in factors:
+        for v in f.variables:
+            neighbors.setdefault(v, set()).update(f.variables)
+    for v in neighbors:
+        neighbors[v].discard(v)
+
+    # (鄰居數, 變數) 的 heap；鄰居數變了就再推一筆，舊的在 pop 時略過
+    heap = [(len(adjacent), v) for v, adjacent in neighbors.items()]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        size, variable = heapq.heappop(heap)
+        if variable not in neighbors or len(neighbors[variable]) != size:
+            continue
+        adjacent = neighbors.pop(variable)
+        for v in adjacent:
+            neighbors[v] |= adjacent
+            neighbors[v].discard(v)
+            neighbors[v].discard(variable)
+            heapq.heappush(heap, (len(neighbors[v]), v))
+        order.append(variable)
+    return order
+
+
+def clique_tree(factors):
+    """
+    Build the tree of elimination steps for `factors`.
+
+    Step k sums out order[k]. Each factor is attached to the step of
+    its first eliminated variable, and each step's result is passed to
+    the step that eliminates the first remaining variable in it.
+    Returns (order, local, scope, parent): the variable, attached
+    factors, variables involved and parent step (None for a root) of
+    every step.
+    """
+    order = elimination_order(factors)
+    position = {v: i for i, v in enumerate(order)}
+    local = [[] for _ in order]
+    for f in factors:
+        local[min(position[v] for v in f.variables)].append(f)
+
+    scope = [set() for _ in order]
+    parent = [None] * len(order)
+    for k, variable in enumerate(order):
+        for f in local[k]:
+            scope[k].update(f.variables)
+        separator = scope[k] - {variable}
+        if separator:
+            # 傳給下一個被消去的變數所在的步驟（一定在 k 之後，所以它的 scope 還沒算完）
+            parent[k] = min(position[v] for v in separator)
+            scope[parent[k]].update(separator)
+    return order, local, scope, parent
+
+
+def eliminate(factors):
+    """
+    Return {variable: unnormalized marginal as {genes: value}} for
+    every variable of `factors`.
+
+    This is variable elimination run as two passes over the clique
+    tree: the upward pass sums each variable out once, and the
+    downward pass sends each step the rest of the evidence, so every
+    marginal costs one extra message instead of a fresh elimination.
+    The messages to a step's children are built from prefix and suffix
+    products of their upward messages, so a large sibship costs time
+    linear in its size.
+    """
+    order, local, scope, parent = clique_tree(factors)
+    children = [[] for _ in order]
+    for k, j in enumerate(parent):
+        if j is not None:
+            children[j].append(k)
+
+    # 由下往上：up[k] 是步驟 k 消去 order[k] 後傳給 parent 的訊息
+    up = [None] * len(order)
+    for k, variable in enumerate(order):
+        belief = product(local[k] + [up[c] for c in children[k]])
+        separator = tuple(v for v in belief.variables if v != variable)
+        up[k] = belief.project(separator).normalized()
+
+    # 由上往下：down[k] 是 parent 傳給步驟 k 的其餘證據
+    down = [None] * len(order)
+    marginals = {}
+    for k in reversed(range(len(order))):
+        incoming = local[k] + ([down[k]] if down[k] is not None else [])
+        ups = [up[c] for c in children[k]]
+
+        # prefix[i] 是 incoming 和前 i 個 children 訊息的乘積，suffix[i] 是第 i 個之後的，
+        # 這樣「除了 c 以外的全部」只要一次乘法，不用每個 children 都重乘一遍
+        prefix = [product(incoming)]
+        for message in ups:
+            prefix.append(prefix[-1].multiply(message).normalized())
+        suffix = [Factor((), {(): 1})]
+        for message in reversed(ups):
+            suffix.append(message.multiply(suffix[-1]).normalized())
+        suffix.reverse()
+
+        marginal = prefix[-1].project((order[k],))
+        marginals[order[k]] = {g: marginal.table.get((g,), 0) for g in (0, 1, 2)}
+        for i, c in enumerate(children[k]):
+            message = prefix[i].multiply(suffix[i + 1])
+            down[c] = message.project(
+                tuple(v for v in message.variables if v in scope[c])
+            ).normalized()
+    return marginals
+
+
+def eliminate_probabilities(people, tracer=None):
+    """
+    Compute the same distributions as enumerate_probabilities using
+    variable elimination over the pedigree. This is linear in the
+    number of people for tree-like pedigrees instead of exponential.
+    """
+    if tracer is None:
+        marginals = eliminate(pedigree_factors(people))
+    else:
+        with tracer.phase("pedigree_factors"):
+            factors = pedigree_factors(people)
+        with tracer.phase("eliminate"):
+            marginals = eliminate(factors)
+        tracer.count("people", len(people))
+    probabilities = empty_probabilities(people)
+    for person in people:
+        evidence = people[person]["trait"]
+        for genes, p in marginals[person].items():
+            probabilities[person]["gene"][genes] = p
+            if evidence is None:
+                for has_trait in (True, False):
+                    probabilities[person]["trait"][has_trait] += p * PROBS["trait"][genes][has_trait]
+            else:
+                probabilities[person]["trait"][evidence] += p
+    normalize(probabilities)
+    return probabilities
+
+
+class BatchEvaluator():
+    """
+    Evaluates joint_probability for many assignments at once.
+
+    People are numbered 0..n-1 in `people` order. An assignment is a
+    row of gene counts plus an integer trait bitmask whose bit i is set
+    when person i has the trait. The prior, inheritance and trait
+    tables are numpy lookup tables built once from PROBS.
+    """
+
+    def __init__(self, people):
+        if np is None:
+            raise ImportError("vectorized evaluation requires numpy")
+        self.names = list(people)
+        self.n = len(self.names)
+        index = {name: i for i, name in enumerate(self.names)}
+
+        # 沒有列出的父母和 joint_probability 一樣當作 0 個基因：指向固定為 0 的額外一欄
+        self.mother = np.full(self.n, self.n)
+        self.father = np.full(self.n, self.n)
+        founder = []
+        for i, name in enumerate(self.names):
+            data = people[name]
+            if data["mother"] is None and data["father"] is None:
+                founder.append(i)
+            if data["mother"] is not None:
+                self.mother[i] = index[data["mother"]]
+            if data["father"] is not None:
+                self.father[i] = index[data["father"]]
+        self.founder = np.array(founder, dtype=np.intp)
+        self.child = np.setdiff1d(np.arange(self.n), self.founder)
+
+        self.prior = np.array([PROBS["gene"][g] for g in (0, 1, 2)])
+        self.trait = np.array([
+            [PROBS["trait"][g][False], PROBS["trait"][g][True]] for g in (0, 1, 2)
+        ])
+        inheritance = inheritance_table()
+        self.inheritance = np.array([
+            [[inheritance[m, f][g] for g in (0, 1, 2)] for f in (0, 1, 2)]
+            for m in (0, 1, 2)
+        ])
+        self.bits = np.arange(self.n, dtype=np.int64)
+
+        known = [(i, people[name]["trait"]) for i, name in enumerate(self.names)]
+        self.unknown = np.array([i for i, t in known if t is None], dtype=np.int64)
+        self.evidence = sum(1 << i for i, t in known if t)
+
+    def traits(self, masks):
+        """
+        Unpack trait bitmasks into a (batch, n) array of 0/1.
+        """
+        return (masks[:, None] >> self.bits) & 1
+
+    def joint(self, genes, masks):
+        """
+        Return the joint probability of each assignment: `genes` is a
+        (batch, n) integer array and `masks` a (batch,) int64 array.
+        """
+        padded = np.concatenate([genes, np.zeros((len(genes), 1), genes.dtype)], axis=1)
+        factors = np.empty(genes.shape)
+        factors[:, self.founder] = self.prior[genes[:, self.founder]]
+        factors[:, self.child] = self.inheritance[
+            padded[:, self.mother[self.child]],
+            padded[:, self.father[self.child]],
+            genes[:, self.child]
+        ]
+        factors *= self.trait[genes, self.traits(masks)]
+        return factors.prod(axis=1)
+
+    def assignments(self, start, stop):
+        """
+        Decode assignments start..stop-1 of the 3^n * 2^u assignments
+        consistent with the trait evidence (u = people with an unknown
+        trait) into (genes, masks).
+        """
+        flat = np.arange(start, stop, dtype=np.int64)
+        free = flat % (1 << len(self.unknown))
+        codes = flat >> len(self.unknown)
+        genes = (codes[:, None] // 3 ** np.arange(self.n, dtype=np.int64)) % 3
+        masks = np.full(len(flat), self.evidence, dtype=np.int64)
+        for k, i in enumerate(self.unknown):
+            masks |= ((free >> k) & 1) << i
+        return genes, masks
+
+    def size(self):
+        return 3 ** self.n << len(self.unknown)
+
+    def accumulate(self, probabilities, genes, masks, p):
+        """
+        Add each assignment's probability `p` to `probabilities` with
+        one weighted count per gene value and trait value.
+        """
+        traits = self.traits(masks)
+        gene_totals = [(p[:, None] * (genes == g)).sum(axis=0) for g in (0, 1, 2)]
+        has_trait = p @ traits
+        lacks_trait = p @ (1 - traits)
+        for i, name in enumerate(self.names):
+            for g in (0, 1, 2):
+                probabilities[name]["gene"][g] += gene_totals[g][i]
+            probabilities[name]["trait"][True] += has_trait[i]
+            probabilities[name]["trait"][False] += lacks_trait[i]
+
+
+def vectorized_probabilities(people, batch_size=1 << 16, tracer=None):
+    """
+    Compute the same distributions as enumerate_probabilities, scoring
+    the assignments consistent with the known traits `batch_size` at
+    a time with a BatchEvaluator.
+    """
+    evaluator = BatchEvaluator(people)
+    probabilities = empty_probabilities(people)
+    total = evaluator.size()
+    if tracer is not None:
+        tracer.count("assignments pruned by evidence", (3 ** evaluator.n << evaluator.n) - total)
+    for start in range(0, total, batch_size):
+        stop = min(start + batch_size, total)
+        if tracer is None:
+            genes, masks = evaluator.assignments(start, stop)
+            p = evaluator.joint(genes, masks)
+            evaluator.accumulate(probabilities, genes, masks, p)
+            continue
+
+        with tracer.phase("assignments"):
+            genes, masks = evaluator.assignments(start, stop)
+        with tracer.phase("joint"):
+            p = evaluator.joint(genes, masks)
+        with tracer.phase("accumulate"):
+            evaluator.accumulate(probabilities, genes, masks, p)
+        tracer.count("assignments evaluated", stop - start)
+        tracer.count("batches")
+        for row in range(stop - start):
+            if tracer.wants_sample():
+                tracer.sample(
+                    dict(zip(evaluator.names, genes[row].tolist())),
+                    {name for name, bit in zip(evaluator.names, evaluator.traits(masks[row:row + 1])[0]) if bit},
+                    float(p[row])
+                )
+    for person in probabilities:
+        for field in probabilities[person]:
+            for value, p in probabilities[person][field].items():
+                probabilities[person][field][value] = float(p)
+    normalize(probabilities)
+    return probabilities
+
+
+def synthetic_family(n, seed=0):
+    """
+    Return a random tree-like `people` dict of `n` people in load_data's
+    format.
+
+    Each couple is one person already in the family and a new founder
+    who marries in, and every child belongs to exactly one couple, so
+    the pedigree has no loops. About half of the traits are known.
+    """
+    rng = random.Random(seed)
+    people = {}
+    couples = []
+    single = []
+
+    def add(mother=None, father=None):
+        name = f"P{len(people)}"
+        people[name] = {
+            "name": name,
+            "mother": mother,
+            "father": father,
+            "trait": rng.choice([None, True, False, False])
+        }
+        return name
+
+    single.append(add())
+    while len(people) < n:
+        if single and len(people) <= n - 2 and (not couples or rng.random() < 0.4):
+            partner = single.pop(rng.randrange(len(single)))
+            couples.append((partner, add()))
+        if couples:
+            single.append(add(*rng.choice(couples)))
+        else:
+            single.append(add())
+    return people
+
+
+def max_difference(a, b):
+    """
+    Return the largest absolute difference between two probability tables.
+    """
+    return max(
+        abs(a[person][field][value] - b[person][field][value])
+        for person in a
+        for field in a[person]
+        for value in a[person][field]
+    )
+
+
+def benchmark(sizes, enumeration_limit=7, vectorized_limit=10, seed=0):
+    """
+    Time enumeration, pruned enumeration and batched numpy enumeration
+    against variable elimination on synthetic families of each size.
+    The enumerations only run up to `enumeration_limit` and
+    `vectorized_limit` people;
+    where they run, print their largest difference from elimination.
+    """
+    for n in sizes:
+        people = synthetic_family(n, seed)
+
+        start = time.perf_counter()
+        exact = eliminate_probabilities(people)
+        elapsed = time.perf_counter() - start
+        line = f"n={n}: elimination {elapsed:.4f}s"
+
+        if n <= enumeration_limit:
+            start = time.perf_counter()
+            expected = enumerate_probabilities(people)
+            elapsed = time.perf_counter() - start
+            line += (f", enumeration {elapsed:.4f}s "
+                     f"(max difference {max_difference(exact, expected):.2e})")
+
+            counts = Counter()
+            start = time.perf_counter()
+            expected = pruned_probabilities(people, counts=counts)
+            elapsed = time.perf_counter() - start
+            line += (f", pruned {elapsed:.4f}s over {counts['assignments evaluated']} assignments "
+                     f"(max difference {max_difference(exact, expected):.2e})")
+
+        if np is not None and n <= vectorized_limit:
+            start = time.perf_counter()
+            expected = vectorized_probabilities(people)
+            elapsed = time.perf_counter() - start
+            line += (f", vectorized {elapsed:.4f}s "
+                     f"(max difference {max_difference(exact, expected):.2e})")
+        print(line)
+
+
 if __name__ == "__main__":
     main()
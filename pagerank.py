@@ -1,21 +1,145 @@
+import argparse
+import bisect
+import heapq
+import concurrent.futures
+import json
+import math
+import mmap
+import multiprocessing
 import os
 import random
 import re
+import struct
 import sys
+import time
+from array import array
+from collections import deque
+from collections.abc import Sequence
+
+try:
+    import numpy as np
+except ImportError:  # 只有向量化的版本需要 numpy
+    np = None
 
 DAMPING = 0.85
 SAMPLES = 10000
 
 
+def parse_args(argv=None):
+    """
+    Parse command-line arguments for pagerank.py.
+    """
+    parser = argparse.ArgumentParser(
+        prog="pagerank.py",
+        usage="python pagerank.py corpus [options]"
+    )
+    parser.add_argument("corpus", nargs="?")
+    parser.add_argument("--sparse", action="store_true",
+                        help="iterate with the NumPy sparse engine")
+    parser.add_argument("--solver", choices=["power", "gauss-seidel", "aitken", "adaptive"],
+                        help="iterate with a sparse solver instead of the dictionary loop")
+    parser.add_argument("--tolerance", type=float, default=0.001,
+                        help="convergence tolerance for --solver (default: 0.001)")
+    parser.add_argument("--norm", choices=["max", "l1"], default="max",
+                        help="how --tolerance measures change (default: max)")
+    parser.add_argument("--compare-solvers", action="store_true",
+                        help="print iterations and wall time of every solver")
+    parser.add_argument("--trace", action="store_true",
+                        help="with --compare-solvers, print per-iteration residuals")
+    parser.add_argument("--personalize", metavar="FILE",
+                        help="print personalized PageRank for each line of seed pages in FILE")
+    parser.add_argument("--convert", metavar="FILE",
+                        help="crawl the corpus and write it to FILE in the on-disk graph format")
+    parser.add_argument("--graph", metavar="FILE",
+                        help="rank a memory-mapped graph file instead of a corpus directory")
+    parser.add_argument("--samples", type=int, default=SAMPLES,
+                        help=f"random-surfer steps to sample (default: {SAMPLES})")
+    parser.add_argument("--walkers", type=int, metavar="W",
+                        help="split sampling across W independent walkers")
+    parser.add_argument("--processes", type=int, metavar="P",
+                        help="worker processes for --walkers (default: all cores)")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="step all walkers together with NumPy instead of processes")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="base seed for --walkers")
+    parser.add_argument("--scaling", action="store_true",
+                        help="report multi-walker speedup from 1 to all cores")
+    parser.add_argument("--benchmark", type=int, nargs="*", metavar="PAGES",
+                        help="time the sparse engine on synthetic corpora")
+    parser.add_argument("--harness", type=int, nargs="*", metavar="PAGES",
+                        help="time and check accuracy of sampling vs iteration on "
+                             "synthetic corpora, writing JSON lines")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write --harness results to FILE instead of stdout")
+    args = parser.parse_args(argv)
+    if (args.corpus is None and args.graph is None
+            and args.benchmark is None and args.harness is None
+            and not args.scaling and not args.compare_solvers):
+        parser.error("a corpus directory is required")
+    return args
+
+
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])  #corpus是一個dictionary，key是頁面名稱，value是一個set，裡面是這個頁面連結到的頁面
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES) #sample_pagerank是一個重要函數，利用sampling的方式計算pagerank
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
+    args = parse_args()
+    if args.benchmark is not None:
+        benchmark(args.benchmark or (10 ** 4, 10 ** 5, 10 ** 6))
+        return
+    if args.harness is not None:
+        sizes = args.harness or (100, 500, 2000)
+        if args.output:
+            with open(args.output, "w") as f:
+                harness(f, sizes, seed=args.seed)
+        else:
+            harness(sys.stdout, sizes, seed=args.seed)
+        return
+    if args.scaling:
+        graph = LinkGraph.from_corpus(crawl(args.corpus)) if args.corpus else synthetic_graph(10 ** 5)
+        scaling_benchmark(graph, DAMPING, args.samples, args.walkers, args.seed)
+        return
+    if args.convert:
+        write_graph(crawl_graph(args.corpus), args.convert)
+        return
+    if args.graph:
+        graph = load_graph(args.graph)
+        for title, ranks in (
+            (f"Sampling (n = {args.samples})", sample_pagerank_graph(graph, DAMPING, args.samples)),
+            ("Iteration", iterate_pagerank_graph(graph, DAMPING)),
+        ):
+            print(f"Top PageRank Results from {title}")
+            for i in sorted(range(len(graph)), key=lambda i: -ranks[i])[:20]:
+                print(f"  {graph.pages[i]}: {ranks[i]:.4f}")
+        return
+    if args.personalize:
+        graph = crawl_graph(args.corpus)
+        with open(args.personalize) as f:
+            seed_sets = [line.split() for line in f if line.strip()]
+        ranks = personalized_pagerank(graph, teleport_matrix(graph, seed_sets), DAMPING)
+        for k, seeds in enumerate(seed_sets):
+            print(f"PageRank personalized to {' '.join(seeds)}")
+            for i in np.argsort(-ranks[:, k])[:10]:
+                print(f"  {graph.pages[i]}: {ranks[i, k]:.4f}")
+        return
+    if args.compare_solvers:
+        graph = crawl_graph(args.corpus) if args.corpus else synthetic_graph(10 ** 4)
+        compare_solvers(graph, DAMPING, trace=args.trace)
+        return
+    corpus = crawl(args.corpus)  #corpus是一個dictionary，key是頁面名稱，value是一個set，裡面是這個頁面連結到的頁面
+    if args.vectorized:
+        ranks = sample_pagerank_vectorized(corpus, DAMPING, args.samples,
+                                           args.walkers or 1000, args.seed)
+    elif args.walkers:
+        ranks = sample_pagerank_parallel(corpus, DAMPING, args.samples, args.walkers,
+                                         args.processes, args.seed)
+    else:
+        ranks = sample_pagerank(corpus, DAMPING, args.samples) #sample_pagerank是一個重要函數，利用sampling的方式計算pagerank
+    print(f"PageRank Results from Sampling (n = {args.samples})")
     for page in sorted(ranks): #將ranks裡的頁面按照名稱排序? 注意sorted()函數的用法: sorted(iterable, key, reverse)表示對iterable進行排序，key是排序的依據，reverse是排序的方向
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING) # 利用迭代的方式、以經驗函數?計算pagerank，直到收斂
+    if args.sparse or args.solver:
+        ranks = iterate_pagerank_sparse(corpus, DAMPING, args.tolerance,
+                                        args.solver or "power", args.norm)
+    else:
+        ranks = iterate_pagerank(corpus, DAMPING) # 利用迭代的方式、以經驗函數?計算pagerank，直到收斂
     print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
@@ -27,25 +151,63 @@ def crawl(directory): # 將directory裡的html檔案讀取，並找出每個頁
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
     """
-    pages = dict()
-
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
-
-    # Only include links to other pages in the corpus
-    for filename in pages:
-        pages[filename] = set(
-            link for link in pages[filename]
-            if link in pages
-        )
+    return crawl_graph(directory).to_corpus()
+
+
+# 一個 <a ...href="..."> 標籤最長可能跨過的字元數，串流讀檔時要保留到下一塊
+LINK_PATTERN = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+MAX_TAG = 4096
+CHUNK_SIZE = 1 << 16
+
+
+def extract_links(path):
+    """
+    Return the set of link targets in the HTML file at `path`, reading
+    it in chunks instead of all at once.
+    """
+    links = set()
+    tail = ""
+    with open(path) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ""):
+            text = tail + chunk
+            end = 0
+            for match in LINK_PATTERN.finditer(text):
+                links.add(match.group(1))
+                end = match.end()
+            # 沒讀完的標籤一定從最後 MAX_TAG 個字元內、且在上一個 match 之後開始
+            tail = text[max(end, len(text) - MAX_TAG):]
+    return links
 
-    return pages
+
+def crawl_graph(directory, workers=None, processes=False):
+    """
+    Parse a directory of HTML pages concurrently and return the links
+    between them as a LinkGraph.
+
+    Page names are interned to integer ids in sorted order before any
+    file is read, so each file's links are turned into edges as soon
+    as it is parsed and the ids do not depend on scheduling. Files are
+    parsed in a thread pool, or a process pool if `processes` is true.
+    """
+    pages = sorted(
+        filename for filename in os.listdir(directory)
+        if filename.endswith(".html")
+    )
+    page_index = {page: i for i, page in enumerate(pages)}
+    offsets = array("q", [0])
+    targets = array("i")
+    paths = [os.path.join(directory, page) for page in pages]
+    pool = (concurrent.futures.ProcessPoolExecutor if processes
+            else concurrent.futures.ThreadPoolExecutor)
+    with pool(workers) as executor:
+        for i, links in enumerate(executor.map(extract_links, paths)):
+            # 只保留連到語料庫內其他頁面的連結
+            targets.extend(sorted(
+                page_index[link] for link in links
+                if link in page_index and page_index[link] != i
+            ))
+            offsets.append(len(targets))
+    return LinkGraph(pages, offsets, targets)
 
 
 def transition_model(corpus, page, damping_factor):
@@ -56,6 +218,9 @@ def transition_model(corpus, page, damping_factor):
     With probability `damping_factor`, choose a link at random
     linked to by `page`. With probability `1 - damping_factor`, choose
     a link at random chosen from all pages in the corpus.
+
+    This builds one distribution from scratch; to query many pages of
+    the same corpus, build a TransitionModel once instead.
     """
     transition_probabilities = {}
 
@@ -75,7 +240,77 @@ def transition_model(corpus, page, damping_factor):
             transition_probabilities[linked_page] = 1 / len(corpus)
 
     return transition_probabilities
-    # raise NotImplementedError
+
+
+class TransitionModel():
+    """
+    The random surfer's transition model over a LinkGraph, built once.
+
+    Each page's distribution is stored implicitly: every page gets the
+    same base teleport mass `(1 - damping_factor) / N`, and each page
+    the current page links to gets a boost of
+    `damping_factor / outdegree` on top. A page with no links goes to
+    every page with probability 1 / N.
+    """
+
+    def __init__(self, graph, damping_factor):
+        self.graph = graph
+        self.damping_factor = damping_factor
+        self.n = len(self.graph)
+        self.base = (1 - damping_factor) / self.n
+
+    @classmethod
+    def from_corpus(cls, corpus, damping_factor):
+        return cls(LinkGraph.from_corpus(corpus), damping_factor)
+
+    def boosts(self, page):
+        """
+        Returns {linked page: extra probability} for `page`, in
+        O(outdegree); every other page has probability `self.base`
+        (or 1 / N for all pages if this dictionary is empty).
+        """
+        graph = self.graph
+        links = graph.links(graph.page_index[page])
+        if not len(links):
+            return {}
+        boost = self.damping_factor / len(links)
+        return {graph.pages[j]: boost for j in links}
+
+    def probability(self, page, next_page):
+        """
+        Returns the probability of moving from `page` to `next_page`.
+        """
+        graph = self.graph
+        links = graph.links(graph.page_index[page])
+        if not len(links):
+            return 1 / self.n
+        j = graph.page_index[next_page]
+        k = bisect.bisect_left(links, j)  # from_corpus 的連結是排序過的
+        linked = k < len(links) and links[k] == j
+        return self.base + (self.damping_factor / len(links) if linked else 0)
+
+    def sample(self, page, rng=random):
+        """
+        Draws the next page from `page` with one coin flip and one
+        uniform pick, in O(1).
+        """
+        graph = self.graph
+        links = graph.links(graph.page_index[page])
+        if len(links) and rng.random() < self.damping_factor:
+            return graph.pages[links[int(rng.random() * len(links))]]
+        return graph.pages[int(rng.random() * self.n)]
+
+    def distribution(self, page):
+        """
+        Returns the full distribution over next pages as a dictionary,
+        as transition_model does.
+        """
+        boosts = self.boosts(page)
+        base = self.base if boosts else 1 / self.n
+        return {
+            next_page: base + boosts.get(next_page, 0)
+            for next_page in self.graph.pages
+        }
 
 
 def sample_pagerank(corpus, damping_factor, n): #重要函數，利用sampling的方式計算pagerank
@@ -87,19 +322,146 @@ def sample_pagerank(corpus, damping_factor, n): #重要函數，利用sampling
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    pagerank = {page: 0 for page in corpus}
-    # Start with a random page
-    current_page = random.choice(list(corpus.keys()))   
+    # 每一步只要一次擲硬幣決定跟連結走或隨機跳頁，再從預先建好的連結陣列均勻挑一個，O(1)
+    graph = LinkGraph.from_corpus(corpus)
+    counts = random_walk(graph, damping_factor, n)
+    return {page: counts[graph.page_index[page]] / n for page in corpus}
 
+
+def random_walk(graph, damping_factor, n, rng=random):
+    """
+    Walk `n` steps of the random surfer over a LinkGraph, starting at
+    a random page, and return how many times each page was visited.
+
+    With probability `damping_factor` the surfer follows one of the
+    current page's links uniformly at random; otherwise, or if the
+    page has no links, it jumps to any page uniformly at random. This
+    is the distribution of transition_model, drawn in O(1) per step.
+    """
+    N = len(graph)
+    offsets = graph.offsets
+    targets = graph.targets
+    uniform = rng.random
+    counts = [0] * N
+    current = int(uniform() * N)
     for _ in range(n):
-        # Update the pagerank of the current page
-        pagerank[current_page] += 1 / n
-        # Get the transition model for the current page
-        transition_model_probabilities = transition_model(corpus, current_page, damping_factor)
-        # Choose the next page based on the transition model
-        current_page = random.choices(list(transition_model_probabilities.keys()), weights=transition_model_probabilities.values(), k=1)[0]
-    return pagerank
-    # raise NotImplementedError
+        counts[current] += 1
+        start = offsets[current]
+        degree = offsets[current + 1] - start
+        if degree and uniform() < damping_factor:
+            current = targets[start + int(uniform() * degree)]
+        else:
+            current = int(uniform() * N)
+    return counts
+
+
+# 給 worker 行程用的圖；fork 時直接繼承，不必每個任務重新 pickle
+_walk_graph = None
+
+
+def _init_walker(graph):
+    global _walk_graph
+    _walk_graph = graph
+
+
+def _walk_task(task):
+    damping_factor, steps, seed = task
+    return random_walk(_walk_graph, damping_factor, steps, random.Random(seed))
+
+
+def parallel_walk(graph, damping_factor, n, walkers, processes=None, seed=0):
+    """
+    Split `n` steps across `walkers` independent random walks run in a
+    process pool and return the merged visit counts.
+
+    Walker `i` draws from its own `random.Random(f"{seed}:{i}")`, so
+    the counts depend only on `seed` and `walkers`, not on how the
+    walks are scheduled across processes.
+    """
+    tasks = [
+        (damping_factor, n // walkers + (i < n % walkers), f"{seed}:{i}")
+        for i in range(walkers)
+    ]
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with context.Pool(processes, initializer=_init_walker, initargs=(graph,)) as pool:
+        results = pool.map(_walk_task, tasks)
+    return [sum(visits) for visits in zip(*results)]
+
+
+def sample_pagerank_parallel(corpus, damping_factor, n, walkers, processes=None, seed=0):
+    """
+    Same estimate as sample_pagerank, from `walkers` independent walks
+    run across a process pool and reproducible for a given `seed`.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    counts = parallel_walk(graph, damping_factor, n, walkers, processes, seed)
+    return {page: counts[graph.page_index[page]] / n for page in corpus}
+
+
+def vectorized_walk(graph, damping_factor, n, walkers, seed=0, burn_in=None):
+    """
+    Step `walkers` random surfers in lockstep with NumPy until about
+    `n` steps are taken in total, and return the visit counts.
+
+    Each walker only takes about n / walkers counted steps, so the
+    uniform start would bias a short walk towards uniform. Every walker
+    therefore first takes `burn_in` uncounted steps. By default that is
+    the smallest t with damping_factor ** t < 0.001: the surfer's
+    distribution approaches PageRank at least as fast as
+    damping_factor ** t, so this leaves under 0.1% of the start in it.
+    """
+    if np is None:
+        raise ImportError("vectorized sampling requires numpy")
+    rng = np.random.default_rng(seed)
+    N = len(graph)
+    offsets = np.frombuffer(graph.offsets, dtype=np.int64)
+    targets = np.frombuffer(graph.targets, dtype=np.int32)
+    degree = np.diff(offsets)
+    counts = np.zeros(N, dtype=np.int64)
+    if burn_in is None:
+        burn_in = math.ceil(math.log(0.001) / math.log(damping_factor)) if 0 < damping_factor < 1 else 0
+    current = rng.integers(N, size=walkers)
+    for step in range(burn_in + -(-n // walkers)):
+        if step >= burn_in:
+            counts += np.bincount(current, minlength=N)
+        follow = (degree[current] > 0) & (rng.random(walkers) < damping_factor)
+        jump = rng.integers(N, size=walkers)
+        pick = offsets[current] + (rng.random(walkers) * degree[current]).astype(np.int64)
+        # 只有 follow 的 walker 才去讀 targets，沒有連結的圖 targets 是空的
+        current = jump
+        current[follow] = targets[pick[follow]]
+    return counts
+
+
+def sample_pagerank_vectorized(corpus, damping_factor, n, walkers=1000, seed=0):
+    """
+    Same estimate as sample_pagerank, from `walkers` surfers stepped
+    together with NumPy and reproducible for a given `seed`. Each
+    walker is burned in first (see vectorized_walk), so the estimate
+    is not pulled towards uniform when n / walkers is small.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    counts = vectorized_walk(graph, damping_factor, n, walkers, seed)
+    total = counts.sum()
+    return {page: float(counts[graph.page_index[page]] / total) for page in corpus}
+
+
+def scaling_benchmark(graph, damping_factor, n, walkers=None, seed=0):
+    """
+    Time parallel_walk with 1 process up to one per core and print the
+    speedup over a single process.
+    """
+    cores = os.cpu_count() or 1
+    walkers = walkers or cores
+    baseline = None
+    for processes in range(1, cores + 1):
+        start = time.perf_counter()
+        parallel_walk(graph, damping_factor, n, walkers, processes, seed)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{processes} processes: {elapsed:.3f}s, speedup {baseline / elapsed:.2f}x")
+
 
 def iterate_pagerank(corpus, damping_factor):
     """
@@ -140,8 +502,867 @@ def iterate_pagerank(corpus, damping_factor):
     return pagerank
 
 
+class LinkGraph():
+    """
+    A corpus stored as CSR arrays over integer page ids.
+
+    Pages are numbered in sorted order; the pages linked to by page `i`
+    are `targets[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, pages, offsets, targets):
+        self.pages = pages
+        self.offsets = offsets
+        self.targets = targets
+        self._page_index = None
+
+    @property
+    def page_index(self):
+        # 用到才建，讀 mmap 圖檔時不必先把所有頁名載進記憶體
+        if self._page_index is None:
+            self._page_index = {page: i for i, page in enumerate(self.pages)}
+        return self._page_index
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        pages = sorted(corpus)
+        page_index = {page: i for i, page in enumerate(pages)}
+        offsets = array("q", [0])
+        targets = array("i")
+        for page in pages:
+            targets.extend(sorted(page_index[link] for link in corpus[page]
+                                  if link in page_index))
+            offsets.append(len(targets))
+        return cls(pages, offsets, targets)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def links(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def edges(self):
+        """
+        Yields every link as a (source, target) pair of page ids.
+        """
+        for i in range(len(self.pages)):
+            for j in self.links(i):
+                yield i, j
+
+    def to_corpus(self):
+        """
+        Returns the graph as the dictionary returned by crawl.
+        """
+        return {
+            page: {self.pages[j] for j in self.links(i)}
+            for i, page in enumerate(self.pages)
+        }
+
+
+class _CSRTransition():
+    """
+    What TransitionMatrix and ChunkedTransitionMatrix share: the page
+    count, the graph's CSR arrays as NumPy views, the dangling pages
+    and each page's 1 / outdegree, and step() built on the subclass's
+    spread().
+    """
+
+    def __init__(self, graph):
+        if np is None:
+            raise ImportError("the sparse PageRank engine requires numpy")
+        self.n = len(graph)
+        self.offsets = np.frombuffer(graph.offsets, dtype=np.int64)
+        self.targets = np.frombuffer(graph.targets, dtype=np.int32)
+        outdegree = np.diff(self.offsets)
+        self.dangling = outdegree == 0
+        self.inverse_outdegree = np.zeros(self.n)
+        self.inverse_outdegree[~self.dangling] = 1 / outdegree[~self.dangling]
+
+    def step(self, rank, damping_factor):
+        """
+        Returns the next PageRank vector. Dangling pages are treated as
+        linking to every page, which adds the same rank-one correction
+        to every entry instead of densifying the matrix.
+        """
+        teleport = (1 - damping_factor + damping_factor * rank[self.dangling].sum()) / self.n
+        return damping_factor * self.spread(rank) + teleport
+
+
+class TransitionMatrix(_CSRTransition):
+    """
+    The link structure of a LinkGraph as NumPy edge arrays, for
+    computing one step of the random surfer in O(pages + links).
+    """
+
+    def __init__(self, graph):
+        super().__init__(graph)
+        self.sources = np.repeat(np.arange(self.n, dtype=np.int32), np.diff(self.offsets))
+        self._in_links = None
+
+    @property
+    def in_links(self):
+        """
+        The links sorted by target, as (sources, linked, starts): the
+        source of each link, a mask of pages with at least one in-link,
+        and where each of those pages' in-links start in `sources`.
+        """
+        # 第一次用到才建「被誰連結」的排序，之後每批 teleport 向量都共用
+        if self._in_links is None:
+            order = np.argsort(self.targets, kind="stable")
+            indegree = np.bincount(self.targets, minlength=self.n)
+            starts = np.concatenate(([0], np.cumsum(indegree)[:-1]))
+            linked = indegree > 0
+            self._in_links = (self.sources[order], linked, starts[linked])
+        return self._in_links
+
+    def spread(self, rank):
+        """
+        Returns the rank each page receives through links, with every
+        page passing its rank evenly to the pages it links to.
+        """
+        share = (rank * self.inverse_outdegree)[self.sources]
+        return np.bincount(self.targets, weights=share, minlength=self.n)
+
+    def spread_many(self, ranks):
+        """
+        spread() for every column of the N x K matrix `ranks` at once,
+        summing each page's in-links with np.add.reduceat.
+        """
+        in_sources, linked, in_starts = self.in_links
+        result = np.zeros(ranks.shape)
+        if len(in_sources):
+            shares = (ranks * self.inverse_outdegree[:, None])[in_sources]
+            result[linked] = np.add.reduceat(shares, in_starts, axis=0)
+        return result
+
+
+class ChunkedTransitionMatrix(_CSRTransition):
+    """
+    Like TransitionMatrix, but reads the graph's offsets and targets in
+    blocks of `chunk_pages` pages instead of holding per-link arrays,
+    so a memory-mapped graph only needs O(pages) memory to iterate.
+
+    It provides spread() and step(), which is all converge() needs; the
+    solvers that walk per-link arrays and spread_many() need a
+    TransitionMatrix.
+    """
+
+    def __init__(self, graph, chunk_pages=1 << 20):
+        super().__init__(graph)
+        self.chunk_pages = chunk_pages
+
+    def spread(self, rank):
+        result = np.zeros(self.n)
+        share = rank * self.inverse_outdegree
+        for first in range(0, self.n, self.chunk_pages):
+            last = min(first + self.chunk_pages, self.n)
+            start, end = self.offsets[first], self.offsets[last]
+            weights = np.repeat(share[first:last], np.diff(self.offsets[first:last + 1]))
+            result += np.bincount(self.targets[start:end], weights=weights, minlength=self.n)
+        return result
+
+
+def power_iteration(graph, damping_factor, tolerance=0.001, max_iterations=1000,
+                    initial=None):
+    """
+    Return the PageRank vector of a LinkGraph as a NumPy array, iterating
+    until no entry changes by more than `tolerance`.
+
+    Iteration starts from `initial` if given, otherwise from 1 / N.
+    """
+    matrix = TransitionMatrix(graph)
+    if initial is None:
+        initial = np.full(len(graph), 1 / len(graph))
+    return converge(matrix, initial, damping_factor, tolerance, max_iterations)[0]
+
+
+def converge(matrix, rank, damping_factor, tolerance, max_iterations=1000, norm="max"):
+    """
+    Apply `matrix.step` to `rank` until the change between iterations
+    is below `tolerance`, and return (rank, iterations).
+
+    `norm` is "max" (largest change of any entry, as in
+    iterate_pagerank) or "l1" (total change over all entries).
+    """
+    for iteration in range(1, max_iterations + 1):
+        new_rank = matrix.step(rank, damping_factor)
+        change = np.abs(new_rank - rank)
+        if (change.sum() if norm == "l1" else change.max()) < tolerance:
+            return new_rank, iteration
+        rank = new_rank
+    return rank, max_iterations
+
+
+def iterate_pagerank_sparse(corpus, damping_factor, tolerance=0.001, solver="power",
+                            norm="max"):
+    """
+    Same result as iterate_pagerank, computed over a CSR transition
+    matrix with one of the SOLVERS, stopping once the change between
+    iterations (in `norm`, "max" or "l1") is below `tolerance`.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    rank, _ = solve_pagerank(graph, damping_factor, solver, tolerance, norm)
+    return {page: float(rank[i]) for i, page in enumerate(graph.pages)}
+
+
+def _residual(change, norm):
+    return float(change.sum() if norm == "l1" else change.max())
+
 
-    raise NotImplementedError
+def _power_solver(matrix, damping_factor, tolerance, norm, max_iterations, record):
+    rank = np.full(matrix.n, 1 / matrix.n)
+    for _ in range(max_iterations):
+        new_rank = matrix.step(rank, damping_factor)
+        residual = record(_residual(np.abs(new_rank - rank), norm))
+        rank = new_rank
+        if residual < tolerance:
+            break
+    return rank
+
+
+def _gauss_seidel_solver(matrix, damping_factor, tolerance, norm, max_iterations, record):
+    # Gauss-Seidel 要逐點更新，所以改用「被誰連結」的 CSR 跟 Python list
+    n = matrix.n
+    order = np.argsort(matrix.targets, kind="stable")
+    in_sources = matrix.sources[order].tolist()
+    in_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(matrix.targets, minlength=n), out=in_offsets[1:])
+    in_offsets = in_offsets.tolist()
+    inverse_outdegree = matrix.inverse_outdegree.tolist()
+    dangling = matrix.dangling.tolist()
+
+    rank = [1 / n] * n
+    dangling_mass = sum(r for r, d in zip(rank, dangling) if d)
+    base = (1 - damping_factor) / n
+    for _ in range(max_iterations):
+        total = largest = 0.0
+        for i in range(n):
+            linked = 0.0
+            for k in range(in_offsets[i], in_offsets[i + 1]):
+                j = in_sources[k]
+                linked += rank[j] * inverse_outdegree[j]
+            new = base + damping_factor * (linked + dangling_mass / n)
+            change = abs(new - rank[i])
+            total += change
+            largest = max(largest, change)
+            if dangling[i]:
+                dangling_mass += new - rank[i]
+            rank[i] = new  # 同一輪後面的頁面馬上用到新值
+        residual = record(total if norm == "l1" else largest)
+        if residual < tolerance:
+            break
+    rank = np.array(rank)
+    return rank / rank.sum()
+
+
+def _aitken_solver(matrix, damping_factor, tolerance, norm, max_iterations, record,
+                   period=10):
+    rank = np.full(matrix.n, 1 / matrix.n)
+    previous = []
+    for iteration in range(1, max_iterations + 1):
+        new_rank = matrix.step(rank, damping_factor)
+        residual = record(_residual(np.abs(new_rank - rank), norm))
+        previous = (previous + [rank])[-2:]
+        rank = new_rank
+        if residual < tolerance:
+            break
+        if iteration % period == 0 and len(previous) == 2:
+            # Aitken delta-squared: x* = x0 - (x1 - x0)^2 / (x2 - 2 x1 + x0)
+            x0, x1 = previous
+            second = rank - 2 * x1 + x0
+            safe = np.abs(second) > 1e-15
+            extrapolated = rank.copy()
+            extrapolated[safe] = x0[safe] - (x1[safe] - x0[safe]) ** 2 / second[safe]
+            extrapolated = np.maximum(extrapolated, 0)
+            extrapolated /= extrapolated.sum()
+            # 外插不一定有幫助（例如第二大特徵值是複數時），殘差沒變小就放棄這次外插
+            # 試算也是一次矩陣乘法，不論接不接受都記一筆，history 長度才等於乘法次數
+            trial = matrix.step(extrapolated, damping_factor)
+            trial_residual = record(_residual(np.abs(trial - extrapolated), norm))
+            if trial_residual < residual:
+                rank = trial
+                previous = []
+                if trial_residual < tolerance:
+                    break
+    return rank
+
+
+def _adaptive_solver(matrix, damping_factor, tolerance, norm, max_iterations, record):
+    # 變化已小於 tolerance / N 的頁面就凍結，之後只重算還在動的頁面收到的連結
+    n = matrix.n
+    rank = np.full(n, 1 / n)
+    active = np.ones(n, dtype=bool)
+    sources, targets = matrix.sources, matrix.targets
+    for _ in range(max_iterations):
+        share = (rank * matrix.inverse_outdegree)[sources]
+        linked = np.bincount(targets, weights=share, minlength=n)
+        teleport = (1 - damping_factor + damping_factor * rank[matrix.dangling].sum()) / n
+        new_rank = rank.copy()
+        new_rank[active] = damping_factor * linked[active] + teleport
+        change = np.abs(new_rank - rank)
+        residual = record(_residual(change, norm))
+        rank = new_rank
+        if residual < tolerance:
+            break
+        frozen = active & (change < tolerance / n)
+        if frozen.any():
+            active &= ~frozen
+            keep = active[targets]
+            sources, targets = sources[keep], targets[keep]
+    return rank / rank.sum()
+
+
+SOLVERS = {
+    "power": _power_solver,
+    "gauss-seidel": _gauss_seidel_solver,
+    "aitken": _aitken_solver,
+    "adaptive": _adaptive_solver,
+}
+
+
+def solve_pagerank(graph, damping_factor, solver="power", tolerance=1e-6, norm="l1",
+                   max_iterations=1000):
+    """
+    Compute the PageRank vector of a LinkGraph with one of the SOLVERS:
+
+        * "power": Jacobi-style power iteration
+        * "gauss-seidel": in-place updates, each page using the ranks
+          already updated earlier in the same sweep
+        * "aitken": power iteration with Aitken delta-squared
+          extrapolation every 10 iterations, kept only when it lowers
+          the residual
+        * "adaptive": power iteration that freezes pages whose rank
+          has stopped changing and only recomputes the rest
+
+    Iteration stops once the change between iterations, measured in
+    `norm` ("l1" or "max"), is below `tolerance`.
+
+    Returns (rank, history), where history holds one
+    (residual, seconds since start) pair per pass over the matrix, so
+    len(history) counts matrix-vector products; for "aitken" that
+    includes each extrapolation trial, whether or not it was kept.
+    """
+    matrix = TransitionMatrix(graph)
+    history = []
+    start = time.perf_counter()
+
+    def record(residual):
+        history.append((residual, time.perf_counter() - start))
+        return residual
+
+    rank = SOLVERS[solver](matrix, damping_factor, tolerance, norm, max_iterations, record)
+    return rank, history
+
+
+def compare_solvers(graph, damping_factor, tolerance=1e-8, norm="l1", trace=False):
+    """
+    Run every solver on `graph` and print iterations (matrix-vector
+    products, see solve_pagerank), wall time and L1 distance from the
+    power-iteration result; with `trace`, also print each solver's
+    per-iteration residuals.
+    """
+    reference = None
+    for solver in SOLVERS:
+        rank, history = solve_pagerank(graph, damping_factor, solver, tolerance, norm)
+        if reference is None:
+            reference = rank
+        seconds = history[-1][1] if history else 0.0
+        error = float(np.abs(rank - reference).sum())
+        print(f"{solver}: {len(history)} iterations, {seconds:.3f}s, "
+              f"L1 from power {error:.2e}")
+        if trace:
+            for iteration, (residual, elapsed) in enumerate(history, 1):
+                print(f"  {iteration}: residual {residual:.3e} at {elapsed:.3f}s")
+
+
+class IncrementalPageRank():
+    """
+    PageRank of a corpus that changes a few pages or links at a time.
+
+    Link edits patch the CSR arrays of the touched pages only and then
+    push the resulting residual outwards from those pages
+    (Gauss-Southwell style), so an edit costs time proportional to the
+    part of the graph whose rank actually moves. Adding or removing
+    pages changes N, and with it the teleport term of every page, so
+    those edits rebuild the graph and re-run power iteration from the
+    previous ranks instead.
+    """
+
+    def __init__(self, corpus, damping_factor=DAMPING, tolerance=1e-6):
+        self.corpus = {page: set(links) for page, links in corpus.items()}
+        self.damping_factor = damping_factor
+        self.tolerance = tolerance
+        self.graph = LinkGraph.from_corpus(self.corpus)
+        initial = np.full(len(self.graph), 1 / len(self.graph))
+        self.rank, self.iterations = converge(
+            TransitionMatrix(self.graph), initial, damping_factor, tolerance, norm="l1"
+        )
+        self.pushes = 0
+
+    def ranks(self):
+        return {page: float(self.rank[i]) for i, page in enumerate(self.graph.pages)}
+
+    def update(self, added_pages=(), removed_pages=(), added_links=(), removed_links=()):
+        """
+        Apply a batch of edits and re-converge. Links are (page, target)
+        pairs; as in crawl, links to pages outside the corpus and links
+        from a page to itself are ignored.
+
+        Returns the number of power iterations needed, which is 0 when
+        pushing the residual of a link-only edit was enough; the number
+        of pushes is left in `self.pushes`.
+        """
+        removed_pages = set(removed_pages) & self.corpus.keys()
+        added_pages = set(added_pages) - self.corpus.keys()
+        if removed_pages or added_pages:
+            for page in removed_pages:
+                del self.corpus[page]
+            for links in self.corpus.values():
+                links -= removed_pages
+            for page in added_pages:
+                self.corpus[page] = set()
+            self._edit_links(added_links, removed_links)
+            return self._rebuild()
+
+        touched = self._edit_links(added_links, removed_links)
+        self.pushes = 0
+        self.iterations = 0
+        if touched:
+            self._push(self._patch(touched))
+        return self.iterations
+
+    def _edit_links(self, added_links, removed_links):
+        """
+        Apply link edits to `self.corpus` and return the set of pages
+        whose links changed.
+        """
+        touched = set()
+        for page, link in removed_links:
+            if link in self.corpus.get(page, ()):
+                self.corpus[page].discard(link)
+                touched.add(page)
+        for page, link in added_links:
+            if page in self.corpus and link in self.corpus and link != page \
+                    and link not in self.corpus[page]:
+                self.corpus[page].add(link)
+                touched.add(page)
+        return touched
+
+    def _rebuild(self):
+        # 用舊的 rank 當起點，新頁面先給平均值，再整體重新正規化
+        previous = {page: self.rank[i] for i, page in enumerate(self.graph.pages)}
+        self.graph = LinkGraph.from_corpus(self.corpus)
+        n = len(self.graph)
+        initial = np.array([previous.get(page, 1 / n) for page in self.graph.pages])
+        initial /= initial.sum()
+        self.rank, self.iterations = converge(
+            TransitionMatrix(self.graph), initial, self.damping_factor, self.tolerance,
+            norm="l1"
+        )
+        self.pushes = 0
+        return self.iterations
+
+    def _patch(self, touched):
+        """
+        Replace the links of the `touched` pages in the CSR arrays
+        (a few memory copies, no per-page Python work) and return
+        {page id: (old links, new links)}.
+        """
+        graph = self.graph
+        page_index = graph.page_index
+        changes = {}
+        for page in touched:
+            i = page_index[page]
+            changes[i] = (list(graph.links(i)),
+                          sorted(page_index[link] for link in self.corpus[page]))
+
+        targets = array("i")
+        offsets = np.frombuffer(graph.offsets, dtype=np.int64).copy()
+        shift = np.zeros(len(offsets), dtype=np.int64)
+        previous = 0
+        for i in sorted(changes):
+            old, new = changes[i]
+            targets.extend(graph.targets[previous:graph.offsets[i]])
+            targets.extend(new)
+            previous = graph.offsets[i + 1]
+            shift[i + 1] += len(new) - len(old)
+        targets.extend(graph.targets[previous:])
+        offsets += np.cumsum(shift)
+
+        self.graph = LinkGraph(graph.pages, array("q", offsets.tobytes()), targets)
+        self.graph._page_index = page_index
+        return changes
+
+    def _push(self, changes):
+        """
+        Re-converge after the link changes in `changes` by pushing
+        residual from the touched pages.
+
+        With the old ranks x, the new equations x = d M x + teleport
+        only fail at the old and new targets of the touched pages,
+        where the residual is d * x[page] / outdegree with the old and
+        new links. Pushing a page moves its residual into its rank and
+        passes d / outdegree of it to each page it links to. Residual
+        that reaches a page with no links spreads evenly over all
+        pages, and a uniform residual only rescales the solution, so it
+        is left to the final normalization. The page with the largest
+        residual is pushed first until the residuals sum to at most
+        tolerance * (1 - d), which bounds the L1 error by `tolerance`.
+        If that takes more edge visits than a tenth of the links, the
+        change was not local after all, and power iteration finishes
+        the job from the partly updated ranks.
+        """
+        d = self.damping_factor
+        n = len(self.graph)
+        offsets, targets = self.graph.offsets, self.graph.targets
+        rank = self.rank
+        residual = {}
+        for i, (old, new) in changes.items():
+            for links, sign in ((old, -1), (new, 1)):
+                if links:
+                    share = sign * d * rank[i] / len(links)
+                    for j in links:
+                        residual[j] = residual.get(j, 0) + share
+
+        # 每次推殘差最大的頁面（heap 裡舊的 entry 在 pop 時略過），直到殘差總和夠小
+        target = self.tolerance * (1 - d)
+        total = sum(abs(r) for r in residual.values())
+        heap = [(-abs(r), j) for j, r in residual.items()]
+        heapq.heapify(heap)
+        budget = len(targets) // 10  # Python 每訪問一條邊大約是 NumPy 掃一條邊的幾十倍
+        work = 0
+        delta = {}
+        while heap and total > target and work <= budget:
+            size, i = heapq.heappop(heap)
+            r = residual.get(i)
+            if r is None or abs(r) != -size:
+                continue
+            del residual[i]
+            total -= abs(r)
+            delta[i] = delta.get(i, 0) + r
+            self.pushes += 1
+            start, end = offsets[i], offsets[i + 1]
+            work += end - start + 1
+            if start == end:
+                continue
+            share = d * r / (end - start)
+            for j in targets[start:end]:
+                old = residual.get(j, 0)
+                value = old + share
+                residual[j] = value
+                total += abs(value) - abs(old)
+                heapq.heappush(heap, (-abs(value), j))
+
+        rank = rank.copy()
+        if delta:
+            rank[list(delta)] += list(delta.values())
+        rank /= rank.sum()
+        if total > target:
+            rank, self.iterations = converge(
+                TransitionMatrix(self.graph), rank, d, self.tolerance, norm="l1"
+            )
+        self.rank = rank
+
+
+def teleport_matrix(graph, seed_sets):
+    """
+    Returns an N x K teleport matrix whose column k is uniform over the
+    pages in `seed_sets[k]` (page names not in the graph are ignored).
+    """
+    teleport = np.zeros((len(graph), len(seed_sets)))
+    for k, seeds in enumerate(seed_sets):
+        rows = [graph.page_index[page] for page in seeds if page in graph.page_index]
+        if not rows:
+            raise ValueError(f"seed set {k} has no pages in the corpus")
+        teleport[rows, k] = 1 / len(rows)
+    return teleport
+
+
+def personalized_pagerank(graph, teleport, damping_factor=DAMPING, tolerance=1e-6,
+                          max_iterations=1000, batch_size=256):
+    """
+    Solve personalized PageRank for every column of the N x K
+    `teleport` matrix and return the N x K rank matrix.
+
+    With probability `1 - damping_factor` the surfer jumps to a page
+    drawn from its column of `teleport` instead of any page uniformly;
+    a dangling page also sends its rank along that column. Columns are
+    solved `batch_size` at a time as one mat-mat power iteration over
+    the shared TransitionMatrix, until every column's L1 change is
+    below `tolerance`.
+    """
+    matrix = TransitionMatrix(graph)
+    teleport = np.asarray(teleport, dtype=float)
+    teleport = teleport / teleport.sum(axis=0)
+    ranks = np.empty_like(teleport)
+    for first in range(0, teleport.shape[1], batch_size):
+        v = teleport[:, first:first + batch_size]
+        rank = v.copy()
+        for _ in range(max_iterations):
+            dangling_mass = rank[matrix.dangling].sum(axis=0)
+            new_rank = (damping_factor * matrix.spread_many(rank)
+                        + (1 - damping_factor + damping_factor * dangling_mass) * v)
+            change = np.abs(new_rank - rank).sum(axis=0).max()
+            rank = new_rank
+            if change < tolerance:
+                break
+        ranks[:, first:first + batch_size] = rank
+    return ranks
+
+
+GRAPH_MAGIC = b"PRGRAPH1"
+
+
+class PageNames(Sequence):
+    """
+    Page names stored as one UTF-8 blob plus an offset array, decoded
+    one at a time.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def write_graph(graph, path):
+    """
+    Write a LinkGraph to `path` in the on-disk format read by
+    load_graph: a magic string, a length-prefixed JSON header, then
+    the CSR offsets (int64), link targets (int32), page-name offsets
+    (int64) and the page names as one UTF-8 blob.
+    """
+    name_offsets = array("q", [0])
+    names = bytearray()
+    for page in graph.pages:
+        names += page.encode("utf-8")
+        name_offsets.append(len(names))
+
+    sections = {
+        "offsets": bytes(memoryview(graph.offsets).cast("B")),
+        "targets": bytes(memoryview(graph.targets).cast("B")),
+        "name_offsets": name_offsets.tobytes(),
+        "names": bytes(names),
+    }
+    layout = {}
+    position = 0
+    for name, blob in sections.items():
+        layout[name] = [position, len(blob)]
+        position = _align(position + len(blob))
+    header = json.dumps({
+        "pages": len(graph),
+        "links": len(graph.targets),
+        "byteorder": sys.byteorder,
+        "sections": layout,
+    }).encode("utf-8")
+    base = _align(len(GRAPH_MAGIC) + 4 + len(header))
+
+    with open(path, "wb") as f:
+        f.write(GRAPH_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for name, blob in sections.items():
+            f.seek(base + layout[name][0])
+            f.write(blob)
+
+
+def load_graph(path):
+    """
+    Memory-map a graph written by write_graph and return it as a
+    LinkGraph whose arrays and page names are read from the file on
+    demand rather than loaded into memory.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(GRAPH_MAGIC)) != GRAPH_MAGIC:
+            raise ValueError(f"{path} is not a PageRank graph file")
+        (size,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(size))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written with a different byte order")
+        view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    base = _align(len(GRAPH_MAGIC) + 4 + size)
+
+    def section(name):
+        start, length = header["sections"][name]
+        return view[base + start:base + start + length]
+
+    pages = PageNames(section("name_offsets").cast("q"), section("names"))
+    return LinkGraph(pages, section("offsets").cast("q"), section("targets").cast("i"))
+
+
+def iterate_pagerank_graph(graph, damping_factor, tolerance=1e-6, norm="l1",
+                           max_iterations=1000):
+    """
+    Power iteration over a (possibly memory-mapped) LinkGraph using
+    ChunkedTransitionMatrix, returning the rank vector as a NumPy array.
+    """
+    matrix = ChunkedTransitionMatrix(graph)
+    initial = np.full(len(graph), 1 / len(graph))
+    return converge(matrix, initial, damping_factor, tolerance, max_iterations, norm)[0]
+
+
+def sample_pagerank_graph(graph, damping_factor, n):
+    """
+    sample_pagerank over a (possibly memory-mapped) LinkGraph,
+    returning the visit frequency of each page id as a list.
+    """
+    return [count / n for count in random_walk(graph, damping_factor, n)]
+
+
+def synthetic_graph(n, links=8, seed=0):
+    """
+    Returns a random LinkGraph of `n` pages with about `links` links
+    per page, skewed so that low-numbered pages attract most links.
+    """
+    if np is None:
+        raise ImportError("synthetic corpora require numpy")
+    rng = np.random.default_rng(seed)
+    outdegree = rng.poisson(links, n)
+    sources = np.repeat(np.arange(n, dtype=np.int64), outdegree)
+    targets = (n * rng.random(len(sources)) ** 2).astype(np.int64)
+    keys = np.unique(sources * n + targets)
+    sources, targets = keys // n, keys % n
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    pages = [f"{i}.html" for i in range(n)]
+    return LinkGraph(pages, array("q", offsets.tobytes()),
+                     array("i", targets.astype(np.int32).tobytes()))
+
+
+def benchmark(sizes, damping_factor=DAMPING, tolerance=1e-10):
+    """
+    Time the sparse engine on synthetic corpora of each size, and the
+    dictionary-based iterate_pagerank where it is still tractable.
+
+    The sparse engine runs to `tolerance`, so the L1 error shown is
+    that of iterate_pagerank's fixed 0.001 threshold.
+    """
+    for n in sizes:
+        graph = synthetic_graph(n)
+        start = time.perf_counter()
+        rank = power_iteration(graph, damping_factor, tolerance)
+        sparse = time.perf_counter() - start
+        line = f"{n} pages, {len(graph.targets)} links: sparse {sparse:.3f}s"
+        if n <= 2000:
+            corpus = graph.to_corpus()
+            start = time.perf_counter()
+            ranks = iterate_pagerank(corpus, damping_factor)
+            line += f", dict {time.perf_counter() - start:.3f}s"
+            error = sum(abs(ranks[page] - rank[i]) for i, page in enumerate(graph.pages))
+            line += f", dict L1 error {error:.4f}"
+        print(line)
+        if n <= 10 ** 5:
+            print("  " + incremental_benchmark(graph, damping_factor))
+
+
+def synthetic_corpus(kind, n, seed=0):
+    """
+    Returns a random corpus dictionary (as from crawl) of `n` pages:
+
+        * "power-law": out-degrees and link targets both heavy-tailed
+        * "chain": page i links only to page i + 1
+        * "dangling-heavy": like power-law, but half the pages have no links
+    """
+    rng = random.Random(seed)
+    pages = [f"{i}.html" for i in range(n)]
+    corpus = {}
+    for i, page in enumerate(pages):
+        if kind == "chain":
+            links = {pages[i + 1]} if i + 1 < n else set()
+        elif kind == "dangling-heavy" and rng.random() < 0.5:
+            links = set()
+        elif kind in ("power-law", "dangling-heavy"):
+            degree = min(n - 1, int(rng.paretovariate(1.5)))
+            links = {pages[int(n * rng.random() ** 3)] for _ in range(degree)}
+        else:
+            raise ValueError(f"unknown corpus kind: {kind}")
+        corpus[page] = links - {page}
+    return corpus
+
+
+def _reference_ranks(corpus, damping_factor):
+    if np is None:
+        return iterate_pagerank(corpus, damping_factor)
+    return iterate_pagerank_sparse(corpus, damping_factor, 1e-12, norm="l1")
+
+
+def harness(out, sizes=(100, 500, 2000), samples=(10 ** 3, 10 ** 4, 10 ** 5),
+            kinds=("power-law", "chain", "dangling-heavy"), damping_factor=DAMPING, seed=0):
+    """
+    Time sample_pagerank and iterate_pagerank on synthetic corpora and
+    write one JSON object per run to `out`, recording the corpus kind
+    and size, the method, its wall time and the L1 error of its ranks
+    against a tightly converged reference.
+    """
+    methods = [("iterate", lambda corpus: iterate_pagerank(corpus, damping_factor))]
+    if np is not None:
+        methods.append(("iterate-sparse",
+                        lambda corpus: iterate_pagerank_sparse(corpus, damping_factor)))
+    for kind in kinds:
+        for n in sizes:
+            corpus = synthetic_corpus(kind, n, seed)
+            reference = _reference_ranks(corpus, damping_factor)
+            runs = [(name, None, method) for name, method in methods]
+            runs += [
+                ("sample", k, lambda corpus, k=k: sample_pagerank(corpus, damping_factor, k))
+                for k in samples
+            ]
+            for name, k, method in runs:
+                random.seed(seed)
+                start = time.perf_counter()
+                ranks = method(corpus)
+                seconds = time.perf_counter() - start
+                record = {
+                    "graph": kind,
+                    "pages": n,
+                    "links": sum(len(links) for links in corpus.values()),
+                    "method": name,
+                    "samples": k,
+                    "seconds": round(seconds, 6),
+                    "l1_error": sum(abs(ranks[page] - reference[page]) for page in corpus),
+                }
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+
+
+def incremental_benchmark(graph, damping_factor, edits=10, seed=0):
+    """
+    Add and remove `edits` random links in `graph` and compare the
+    time and work of an incremental update against a cold solve of the
+    edited corpus.
+    """
+    rng = random.Random(seed)
+    incremental = IncrementalPageRank(graph.to_corpus(), damping_factor)
+    pages = graph.pages
+    added = [(rng.choice(pages), rng.choice(pages)) for _ in range(edits)]
+    removed = []
+    while len(removed) < edits:
+        i = rng.randrange(len(pages))
+        if len(graph.links(i)):
+            removed.append((pages[i], pages[rng.choice(graph.links(i))]))
+    start = time.perf_counter()
+    warm = incremental.update(added_links=added, removed_links=removed)
+    warm_time = time.perf_counter() - start
+    start = time.perf_counter()
+    cold = IncrementalPageRank(incremental.corpus, damping_factor).iterations
+    cold_time = time.perf_counter() - start
+    return (f"incremental update of {2 * edits} links: {incremental.pushes} pushes + "
+            f"{warm} iterations in {warm_time:.3f}s, cold {cold} iterations in {cold_time:.3f}s")
 
 
 if __name__ == "__main__":
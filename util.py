@@ -1,3 +1,9 @@
+import heapq
+import itertools
+import time
+from collections import deque
+
+
 class Node():
     def __init__(self, state, parent, action):
         self.state = state
@@ -7,13 +13,16 @@ class Node():
 
 class StackFrontier():
     def __init__(self):
-        self.frontier = []
+        self.frontier = deque()
+        # state -> 在 frontier 裡出現的次數，讓 contains_state 不用逐一掃描
+        self.states = {}
 
     def add(self, node):
         self.frontier.append(node)
+        self.states[node.state] = self.states.get(node.state, 0) + 1
 
     def contains_state(self, state):
-        return any(node.state == state for node in self.frontier)
+        return state in self.states
 
     def empty(self):
         return len(self.frontier) == 0
@@ -22,10 +31,17 @@ class StackFrontier():
         if self.empty():
             raise Exception("empty frontier")  #raise(已知例外假設)的權限在else前面，程式會中斷，不會執行else
         else:
-            node = self.frontier[-1]
-            self.frontier = self.frontier[:-1]
+            node = self.frontier.pop()
+            self._discard(node.state)
             return node
 
+    def _discard(self, state):
+        count = self.states[state] - 1
+        if count:
+            self.states[state] = count
+        else:
+            del self.states[state]
+
 
 class QueueFrontier(StackFrontier):
 
@@ -33,6 +49,134 @@ class QueueFrontier(StackFrontier):
         if self.empty():
             raise Exception("empty frontier")
         else:
-            node = self.frontier[0]
-            self.frontier = self.frontier[1:]
+            node = self.frontier.popleft()
+            self._discard(node.state)
+            return node
+
+
+class PriorityFrontier():
+    """
+    Frontier that removes the node with the lowest priority first.
+
+    Lowering the priority of a state already in the frontier pushes a
+    new entry; the old one is skipped when it reaches the top (lazy
+    deletion), so add and remove are O(log n).
+    """
+
+    def __init__(self):
+        self.frontier = []
+        # state -> 目前有效的 (priority, count)，heap 裡其他舊的 entry 都當作已刪除
+        self.entries = {}
+        self.counter = itertools.count()  # priority 相同時依加入順序
+
+    def add(self, node, priority):
+        """
+        Add `node` with `priority`, or lower the priority of its state.
+        Returns False if the state is already queued with a priority
+        no higher than `priority`.
+        """
+        best = self.entries.get(node.state)
+        if best is not None and best[0] <= priority:
+            return False
+        entry = (priority, next(self.counter))
+        self.entries[node.state] = entry
+        heapq.heappush(self.frontier, entry + (node,))
+        return True
+
+    def contains_state(self, state):
+        return state in self.entries
+
+    def priority(self, state):
+        return self.entries[state][0]
+
+    def empty(self):
+        self._drop_stale()
+        return len(self.frontier) == 0
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        else:
+            _, _, node = heapq.heappop(self.frontier)
+            del self.entries[node.state]
             return node
+
+    def _drop_stale(self):
+        while self.frontier:
+            priority, count, node = self.frontier[0]
+            if self.entries.get(node.state) == (priority, count):
+                return
+            heapq.heappop(self.frontier)
+
+
+def best_first_search(start, goal, neighbors, heuristic=lambda state: 0):
+    """
+    A* search from state `start` to state `goal`.
+
+    `neighbors(state)` yields (action, state, cost) triples and
+    `heuristic(state)` returns a lower bound on the remaining cost to
+    `goal` (float("inf") if unreachable). With an admissible and
+    consistent heuristic the first time `goal` is removed from the
+    frontier its path is optimal; with the default heuristic this is
+    uniform-cost search.
+
+    Returns (node, expanded): the goal Node (None if unreachable) and
+    the number of states expanded.
+    """
+    frontier = PriorityFrontier()
+    frontier.add(Node(state=start, parent=None, action=None), heuristic(start))
+    cost = {start: 0}
+    explored = set()
+    expanded = 0
+
+    while not frontier.empty():
+        node = frontier.remove()
+        if node.state == goal:
+            return node, expanded
+        explored.add(node.state)
+        expanded += 1
+        for action, state, step in neighbors(node.state):
+            if state in explored:
+                continue
+            g = cost[node.state] + step
+            if state in cost and cost[state] <= g:
+                continue
+            h = heuristic(state)
+            if h == float("inf"):
+                continue
+            cost[state] = g
+            frontier.add(Node(state=state, parent=node, action=action), g + h)
+    return None, expanded
+
+
+def benchmark(sizes=(10 ** 5, 10 ** 6)):
+    """
+    Time add, contains_state and remove on frontiers of each size.
+    """
+    for frontier_class in (StackFrontier, QueueFrontier):
+        for size in sizes:
+            frontier = frontier_class()
+
+            start = time.perf_counter()
+            for i in range(size):
+                frontier.add(Node(state=i, parent=None, action=None))
+            added = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(0, 2 * size, 2):
+                frontier.contains_state(i)
+            checked = time.perf_counter() - start
+
+            start = time.perf_counter()
+            while not frontier.empty():
+                frontier.remove()
+            removed = time.perf_counter() - start
+
+            print(f"{frontier_class.__name__} n={size}: "
+                  f"add {1e9 * added / size:.0f}ns, "
+                  f"contains {1e9 * checked / size:.0f}ns, "
+                  f"remove {1e9 * removed / size:.0f}ns per op")
+
+
+if __name__ == "__main__":
+    benchmark()